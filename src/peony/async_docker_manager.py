@@ -0,0 +1,275 @@
+import os
+import ssl
+import json
+import time
+import asyncio
+from typing import Optional
+from urllib.parse import quote, urlencode, urlparse
+
+DEFAULT_SOCKET = "/var/run/docker.sock"
+API_VERSION = "v1.41"
+
+
+def get_socket_path() -> str:
+    docker_host = os.environ.get("DOCKER_HOST", "")
+    if docker_host.startswith("unix://"):
+        return docker_host[len("unix://"):]
+    return DEFAULT_SOCKET
+
+
+def get_tls_context() -> Optional[ssl.SSLContext]:
+    # Same rules as the docker CLI: DOCKER_TLS_VERIFY checks the daemon
+    # certificate, DOCKER_CERT_PATH alone only presents the client certificate
+    cert_path = os.environ.get("DOCKER_CERT_PATH")
+    verify = os.environ.get("DOCKER_TLS_VERIFY", "") != ""
+    if not cert_path and not verify:
+        return None
+    cert_path = cert_path or os.path.expanduser("~/.docker")
+
+    if verify:
+        context = ssl.create_default_context(cafile=os.path.join(cert_path, "ca.pem"))
+    else:
+        context = ssl.create_default_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    cert_file = os.path.join(cert_path, "cert.pem")
+    if os.path.exists(cert_file):
+        context.load_cert_chain(cert_file, os.path.join(cert_path, "key.pem"))
+    return context
+
+
+def get_port_binding(attrs: Optional[dict], container_port: int = 1194) -> Optional[int]:
+    if attrs:
+        ports = attrs["HostConfig"].get("PortBindings") or {}
+        port_bindings = ports.get(f"{container_port}/udp") or ports.get(
+            f"{container_port}/tcp"
+        )
+        if port_bindings:
+            return int(port_bindings[0]["HostPort"])
+    return None
+
+
+class AsyncDockerManager:
+    def __init__(
+        self, socket_path: str = None, concurrency: int = 8, base_url: str = None
+    ):
+        self.socket_path = socket_path or get_socket_path()
+        self.tcp_address = None
+        self.ssl_context = None
+        self.ssh_command = None
+        if base_url and base_url.startswith("unix://"):
+            self.socket_path = base_url[len("unix://"):]
+        elif base_url:
+            url = urlparse(base_url)
+            if url.scheme == "ssh":
+                # Like the docker CLI, tunnel the API through `docker system dial-stdio`
+                target = f"{url.username}@{url.hostname}" if url.username else url.hostname
+                port = ["-p", str(url.port)] if url.port else []
+                self.ssh_command = ["ssh", *port, "--", target, "docker", "system", "dial-stdio"]
+            elif url.scheme in ("tcp", "http", "https"):
+                self.ssl_context = get_tls_context()
+                default_port = 2376 if self.ssl_context else 2375
+                self.tcp_address = (url.hostname, url.port or default_port)
+            else:
+                raise ValueError(
+                    f"Unsupported Docker host {base_url} (use unix://, tcp:// or ssh://)"
+                )
+        self.concurrency = concurrency
+        self._semaphore = None
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # Created lazily so the semaphore is bound to the running loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    async def _request(
+        self, method: str, path: str, params: dict = None, body: dict = None
+    ) -> tuple[int, object]:
+        url = f"/{API_VERSION}{path}"
+        if params:
+            url += f"?{urlencode(params)}"
+        payload = json.dumps(body).encode() if body is not None else b""
+        headers = [
+            f"{method} {url} HTTP/1.1",
+            "Host: docker",
+            "Connection: close",
+            f"Content-Length: {len(payload)}",
+        ]
+        if body is not None:
+            headers.append("Content-Type: application/json")
+        request = ("\r\n".join(headers) + "\r\n\r\n").encode() + payload
+
+        async with self.semaphore:
+            process = None
+            if self.ssh_command:
+                process = await asyncio.create_subprocess_exec(
+                    *self.ssh_command,
+                    stdin=asyncio.subprocess.PIPE,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.DEVNULL,
+                )
+                reader, writer = process.stdout, process.stdin
+            elif self.tcp_address:
+                reader, writer = await asyncio.open_connection(
+                    *self.tcp_address, ssl=self.ssl_context
+                )
+            else:
+                reader, writer = await asyncio.open_unix_connection(self.socket_path)
+            try:
+                writer.write(request)
+                await writer.drain()
+                status, response_headers = await self._read_head(reader)
+                data = await self._read_body(reader, response_headers)
+            finally:
+                writer.close()
+                try:
+                    await writer.wait_closed()
+                except (ConnectionError, OSError):
+                    pass
+                if process and process.returncode is None:
+                    process.kill()
+                    await process.wait()
+
+        if not data:
+            return status, None
+        try:
+            return status, json.loads(data)
+        except ValueError:
+            return status, data.decode(errors="replace")
+
+    async def _read_head(self, reader: asyncio.StreamReader) -> tuple[int, dict]:
+        status_line = await reader.readline()
+        parts = status_line.decode().split(" ", 2)
+        if len(parts) < 2 or not parts[1].isdigit():
+            raise Exception(f"Invalid response from Docker API: {status_line!r}")
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode().partition(":")
+            headers[key.strip().lower()] = value.strip()
+        return int(parts[1]), headers
+
+    async def _read_body(self, reader: asyncio.StreamReader, headers: dict) -> bytes:
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";")[0].strip(), 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            return b"".join(chunks)
+        if "content-length" in headers:
+            return await reader.readexactly(int(headers["content-length"]))
+        return await reader.read()
+
+    def _raise_for_status(self, status: int, data: object, action: str) -> None:
+        if status >= 400:
+            message = data.get("message") if isinstance(data, dict) else data
+            raise Exception(f"Failed to {action}: {message}")
+
+    async def get_container(self, name: str) -> Optional[dict]:
+        status, data = await self._request("GET", f"/containers/{quote(name)}/json")
+        if status == 404:
+            return None
+        self._raise_for_status(status, data, f"inspect container {name}")
+        return data
+
+    async def list_containers(self, all: bool = True) -> list:
+        status, data = await self._request(
+            "GET", "/containers/json", params={"all": "1" if all else "0"}
+        )
+        self._raise_for_status(status, data, "list containers")
+        return data or []
+
+    async def restart_container(self, name: str, timeout: int = 15) -> bool:
+        status, data = await self._request(
+            "POST", f"/containers/{quote(name)}/restart", params={"t": timeout}
+        )
+        if status == 404:
+            return False
+        self._raise_for_status(status, data, f"restart container {name}")
+        return True
+
+    async def start_container(self, name: str) -> bool:
+        status, data = await self._request("POST", f"/containers/{quote(name)}/start")
+        if status == 404:
+            return False
+        self._raise_for_status(status, data, f"start container {name}")
+        return True
+
+    async def stop_container(self, name: str, timeout: int = 15) -> bool:
+        status, data = await self._request(
+            "POST", f"/containers/{quote(name)}/stop", params={"t": timeout}
+        )
+        if status == 404:
+            return False
+        self._raise_for_status(status, data, f"stop container {name}")
+        return True
+
+    async def get_container_port(
+        self, name: str, container_port: int = 1194
+    ) -> Optional[int]:
+        return get_port_binding(await self.get_container(name), container_port)
+
+    async def pull_image(self, image: str) -> None:
+        repository, _, tag = image.rpartition(":")
+        if not repository or "/" in tag:
+            repository, tag = image, "latest"
+        status, data = await self._request(
+            "POST", "/images/create", params={"fromImage": repository, "tag": tag}
+        )
+        self._raise_for_status(status, data, f"pull image {image}")
+        # The pull endpoint streams one JSON object per line; errors show up in the stream
+        if isinstance(data, str):
+            for line in data.splitlines():
+                try:
+                    progress = json.loads(line)
+                except ValueError:
+                    continue
+                if "error" in progress:
+                    raise Exception(f"Failed to pull image {image}: {progress['error']}")
+        elif isinstance(data, dict) and "error" in data:
+            raise Exception(f"Failed to pull image {image}: {data['error']}")
+
+    async def get_image(self, image: str) -> Optional[dict]:
+        status, data = await self._request("GET", f"/images/{quote(image)}/json")
+        if status == 404:
+            return None
+        self._raise_for_status(status, data, f"inspect image {image}")
+        return data
+
+    async def inspect_many(self, names: list) -> dict:
+        results = await asyncio.gather(*(self.get_container(n) for n in names))
+        return dict(zip(names, results))
+
+    async def _timed(self, coro) -> tuple[object, float]:
+        start = time.monotonic()
+        try:
+            result = await coro
+        except Exception as e:
+            result = e
+        return result, time.monotonic() - start
+
+    async def restart_many(self, names: list, timeout: int = 15) -> dict:
+        results = await asyncio.gather(
+            *(self._timed(self.restart_container(n, timeout)) for n in names)
+        )
+        return dict(zip(names, results))
+
+    async def stop_many(self, names: list, timeout: int = 15) -> dict:
+        results = await asyncio.gather(
+            *(self._timed(self.stop_container(n, timeout)) for n in names)
+        )
+        return dict(zip(names, results))
+
+    async def start_many(self, names: list) -> dict:
+        results = await asyncio.gather(
+            *(self._timed(self.start_container(n)) for n in names)
+        )
+        return dict(zip(names, results))
@@ -1,15 +1,120 @@
 #!/usr/bin/env python3
 import os
+import sys
+import fcntl
 import argparse
+import subprocess
 from datetime import datetime
 try:
-    from peony.docker_manager import DockerManager
-    from peony.utils import get_backup_path, get_caddy_path
+    from peony.hosts import DockerFleet
+    from peony.logs import backup_excludes, LOG_DEFAULTS
+    from peony.utils import get_backup_path, get_caddy_path, get_config_path, read_settings
 except (ImportError, ModuleNotFoundError):
-    from docker_manager import DockerManager
-    from utils import get_backup_path, get_caddy_path
+    from hosts import DockerFleet
+    from logs import backup_excludes, LOG_DEFAULTS
+    from utils import get_backup_path, get_caddy_path, get_config_path, read_settings
 
-def backup_all(docker: DockerManager, caddy_name: str, backup_dir: str = None, filename: str = None) -> None:
+def get_snapshot_path(name: str = None) -> str:
+   snapshot_dir = os.path.join(os.path.dirname(get_config_path()), "snapshots")
+   os.makedirs(snapshot_dir, exist_ok=True)
+   return os.path.join(snapshot_dir, name) if name else snapshot_dir
+
+# Rewritten in place by openvpn-ui, easy-rsa or Caddy
+MUTABLE_PATHS = ["db", "pki", "config", "data", "server.conf"]
+# Only the files at the top are appended to in place; log/archive segments
+# and index are written by rename and never modified
+MUTABLE_FILE_DIRS = ["log"]
+
+def _copy_path(source: str, target: str) -> None:
+   os.system(f"sudo rm -rf {target}")
+   if os.system(f"sudo cp -a {source} {target}") != 0:
+       raise Exception(f"Failed to copy {source}")
+
+def clone_tree(source: str, target: str, hardlinks: bool = True) -> str:
+   os.makedirs(os.path.dirname(target), exist_ok=True)
+   # Reflinks are copy-on-write at block level. Hardlinks share the inode, so
+   # they are only kept for files peony replaces with atomic renames; paths
+   # changed in place are really copied.
+   methods = [("reflink", "-a --reflink=always"), ("hardlink", "-al"), ("copy", "-a")]
+   for method, flags in methods if hardlinks else [methods[0], methods[2]]:
+       if os.system(f"sudo cp {flags} {source} {target} 2>/dev/null") == 0:
+           if method == "hardlink":
+               for path in MUTABLE_PATHS:
+                   if os.path.exists(os.path.join(source, path)):
+                       _copy_path(os.path.join(source, path), os.path.join(target, path))
+               for path in MUTABLE_FILE_DIRS:
+                   directory = os.path.join(source, path)
+                   for file in os.listdir(directory) if os.path.isdir(directory) else []:
+                       if os.path.isfile(os.path.join(directory, file)):
+                           _copy_path(os.path.join(directory, file), os.path.join(target, path, file))
+           return method
+       os.system(f"sudo rm -rf {target}")
+   raise Exception(f"Failed to snapshot {source}")
+
+def snapshot_backup(name: str, paths: list) -> str:
+   # Names have second resolution; never reuse a pending or archived one
+   base, counter = name, 1
+   while (
+       os.path.exists(get_snapshot_path(name))
+       or os.path.exists(get_snapshot_path(f".tmp-{name}"))
+       or os.path.exists(os.path.join(get_backup_path(), f"{name}.tgz"))
+   ):
+       name = f"{base}-{counter}"
+       counter += 1
+   tmp_dir = get_snapshot_path(f".tmp-{name}")
+   methods = set()
+   for path in paths:
+       if os.path.exists(path):
+           methods.add(clone_tree(path, os.path.join(tmp_dir, path.lstrip("/"))))
+   snapshot_dir = get_snapshot_path(name)
+   os.rename(tmp_dir, snapshot_dir)
+   print(f"Snapshot created: {snapshot_dir} ({', '.join(sorted(methods))})")
+   spawn_archiver()
+   return snapshot_dir
+
+def _pending_snapshots() -> list:
+   return sorted(d for d in os.listdir(get_snapshot_path()) if not d.startswith("."))
+
+def archive_snapshots() -> int:
+   archived = 0
+   while _pending_snapshots():
+       with open(get_snapshot_path(".lock"), "w") as lock:
+           try:
+               fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+           except BlockingIOError:
+               return archived
+
+           for name in _pending_snapshots():
+               snapshot_dir = get_snapshot_path(name)
+               backup_file = os.path.join(get_backup_path(), f"{name}.tgz")
+               tmp_file = f"{backup_file}.part"
+               status = os.waitstatus_to_exitcode(
+                   os.system(f"nice -n 19 sudo tar czf {tmp_file} -C {snapshot_dir} .")
+               )
+               # GNU tar exits 1 when a file changed while being read; the archive is still complete
+               if status == 1:
+                   print(f"⚠️  Warning: files changed while archiving snapshot {snapshot_dir}")
+               elif status != 0:
+                   print(f"Error: failed to archive snapshot {snapshot_dir}")
+                   os.system(f"sudo rm -f {tmp_file}")
+                   return archived
+               os.replace(tmp_file, backup_file)
+               os.system(f"sudo rm -rf {snapshot_dir}")
+               print(f"Backup created: {backup_file}")
+               archived += 1
+   return archived
+
+def spawn_archiver() -> None:
+   log_path = get_snapshot_path(".archive.log")
+   with open(log_path, "a") as log:
+       subprocess.Popen(
+           [sys.executable, os.path.abspath(__file__), "--archive-snapshots"],
+           stdout=log,
+           stderr=log,
+           start_new_session=True,
+       )
+
+def backup_all(docker: DockerFleet, caddy_name: str, backup_dir: str = None, filename: str = None, log_history: str = None) -> None:
    if not backup_dir:
        backup_dir = get_backup_path()
    else:
@@ -23,7 +128,20 @@ def backup_all(docker: DockerManager, caddy_name: str, backup_dir: str = None, f
 
    backup_file = os.path.join(backup_dir, filename)
    has_vpns, vpns = docker.check_for_vpns(caddy_name)
-   backup_cmd = f"sudo tar czf {backup_file} -C / opt/docker/volumes/{caddy_name}"
+   if log_history is None:
+       try:
+           log_history = read_settings("vpn_settings", dict(LOG_DEFAULTS))["log_backup_history"]
+       except Exception:
+           log_history = ""
+
+   excludes = []
+   if has_vpns:
+       for vpn in vpns:
+           excludes += backup_excludes(vpn, log_history)
+
+   backup_cmd = "sudo tar czf " + backup_file
+   backup_cmd += "".join(f" --exclude={path}" for path in excludes)
+   backup_cmd += f" -C / opt/docker/volumes/{caddy_name}"
 
    if has_vpns:
        for vpn in vpns:
@@ -33,21 +151,30 @@ def backup_all(docker: DockerManager, caddy_name: str, backup_dir: str = None, f
    print(f"Backup created: {backup_file}")
    if has_vpns:
        print(f"VPNs included in backup: {', '.join(vpns)}")
+   if excludes:
+       print(f"Log files left out of backup: {len(excludes)}")
 
 def main():
    parser = argparse.ArgumentParser(description="Backup Caddy and VPN(s) config")
    parser.add_argument("--dest", help="Dest directory for backup")
    parser.add_argument("--file", help="Backup file name")
    parser.add_argument("--caddy", default="caddy", help="Caddy container name")
+   parser.add_argument("--log-history", help="VPN log history to include: a duration like 7d, 0 for none or all (default: LOG_BACKUP_HISTORY)")
+   parser.add_argument("--archive-snapshots", action="store_true", help="Compress pending pre-change snapshots into the backup directory")
    args = parser.parse_args()
 
    try:
-       docker = DockerManager()
+       if args.archive_snapshots:
+           archived = archive_snapshots()
+           print(f"{archived} snapshot(s) archived")
+           return
+
+       docker = DockerFleet.from_settings()
        caddy_dir = get_caddy_path(args.caddy)
        if not os.path.exists(caddy_dir):
            raise Exception(f"Caddy server directory {caddy_dir} not found")
 
-       backup_all(docker, args.caddy, args.dest, args.file)
+       backup_all(docker, args.caddy, args.dest, args.file, args.log_history)
        print("Backup completed !")
 
    except Exception as e:
@@ -4,21 +4,29 @@ import argparse
 from datetime import datetime
 try:
     from peony.docker_manager import DockerManager
+    from peony.services import caddy_services, write_services, start_project
     from peony.utils import (
         get_caddy_path, 
         load_template_with_update, 
         read_settings, 
         get_backup_path, 
-        init_config
+        init_config,
+        get_precompress_formats,
+        write_static_file,
+        CADDY_DEFAULTS,
     )
 except (ImportError, ModuleNotFoundError):
     from docker_manager import DockerManager
+    from services import caddy_services, write_services, start_project
     from utils import (
         get_caddy_path, 
         load_template_with_update, 
         read_settings, 
         get_backup_path, 
-        init_config
+        init_config,
+        get_precompress_formats,
+        write_static_file,
+        CADDY_DEFAULTS,
     )
 
 
@@ -53,28 +61,52 @@ def create_directory(output_dir: str) -> None:
     os.makedirs(os.path.join(output_dir, "config"), exist_ok=True)
 
 
+def get_caddyfile_directives(config: dict) -> dict:
+    precompress = get_precompress_formats(config)
+    return {
+        "encode_directive": (
+            f"encode {config['caddy_encode']}" if config.get("caddy_encode") else ""
+        ),
+        "precompressed_directive": (
+            f"precompressed {' '.join(precompress)}" if precompress else ""
+        ),
+        "page_cache": config.get("caddy_page_cache") or "no-cache",
+    }
+
+
 def generate_caddy_templates(
     docker: DockerManager, output_dir: str, name: str, config: dict
 ) -> None:
+    precompress = get_precompress_formats(config)
     context = {
         "hostname": config["hostname"],
         "container_name": name,
         "network": "vpn-proxy",
+        **get_caddyfile_directives(config),
     }
 
     templates = [
         ("Caddyfile", ""),
-        ("docker-compose.yaml", ""),
         ("vpn-select.html", "static/"),
+        ("vpn-unavailable.html", "static/"),
     ]
 
     for template, subdir in templates:
         content = load_template_with_update(
             f"templates/caddy/{template}", context
         )
+        if subdir == "static/":
+            write_static_file(os.path.join(output_dir, subdir, template), content, precompress)
+            continue
         with open(os.path.join(output_dir, subdir, template), "w") as f:
             f.write(content)
 
+    write_services(
+        output_dir,
+        caddy_services(name, output_dir, config.get("vpn_docker_subnet") or "172.28.0.0/24"),
+        "docker-compose.yaml",
+    )
+
 
 def create_caddy(docker: DockerManager, name: str, config: dict) -> None:
     output_dir = get_caddy_path(name)
@@ -84,7 +116,7 @@ def create_caddy(docker: DockerManager, name: str, config: dict) -> None:
         # update_hosts_file(config["hostname"])
         create_directory(output_dir)
         generate_caddy_templates(docker, output_dir, name, config)
-        docker.start_compose(os.path.join(output_dir, "docker-compose.yaml"))
+        start_project(docker, output_dir, "docker-compose.yaml")
     except Exception as e:
         if os.path.exists(output_dir):
             os.system(f"rm -rf {output_dir}")
@@ -123,7 +155,7 @@ def main():
         docker = DockerManager()
         
         if args.action == "create":
-            config = read_settings("caddy_settings", {"hostname": None})
+            config = read_settings("caddy_settings", {"hostname": None, **CADDY_DEFAULTS})
             if not config.get("hostname"):
                 raise ValueError("HOSTNAME is mandatory in caddy_settings")
             create_caddy(docker, args.name, config)
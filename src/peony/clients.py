@@ -0,0 +1,187 @@
+import io
+import os
+import re
+import csv
+import time
+import zipfile
+import tarfile
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+try:
+    from peony.docker_manager import DockerManager
+    from peony.utils import get_config_path, atomic_write
+except (ImportError, ModuleNotFoundError):
+    from docker_manager import DockerManager
+    from utils import get_config_path, atomic_write
+
+
+EASYRSA_DIR = "/usr/share/easy-rsa"
+CLIENT_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_.@-]+$")
+
+
+def read_client_names(csv_path: str) -> list:
+    names = []
+    with open(csv_path, newline="") as f:
+        for row in csv.reader(f):
+            if not row or not row[0].strip() or row[0].startswith("#"):
+                continue
+            name = row[0].strip()
+            if not names and name.lower() in ("name", "client", "user", "username"):
+                continue
+            if not CLIENT_NAME_PATTERN.match(name):
+                raise ValueError(f"Invalid client name: {name}")
+            if name not in names:
+                names.append(name)
+    return names
+
+
+def _easyrsa(docker: DockerManager, vpn_name: str, *args: str) -> str:
+    command = f"cd {EASYRSA_DIR} && ./easyrsa --batch {' '.join(args)}"
+    return docker.exec_in_container(f"{vpn_name}-ui", ["sh", "-c", command])
+
+
+def _read_pem(path: str) -> str:
+    with open(path) as f:
+        content = f.read()
+    start = content.find("-----BEGIN")
+    return content[start:].strip() if start >= 0 else content.strip()
+
+
+def render_ovpn(vpn_path: str, client_name: str) -> str:
+    pki_dir = os.path.join(vpn_path, "pki")
+    with open(os.path.join(vpn_path, "config", "client.conf")) as f:
+        content = f.read()
+
+    blocks = {
+        "ca": os.path.join(pki_dir, "ca.crt"),
+        "cert": os.path.join(pki_dir, "issued", f"{client_name}.crt"),
+        "key": os.path.join(pki_dir, "private", f"{client_name}.key"),
+        "tls-crypt": os.path.join(pki_dir, "ta.key"),
+    }
+    for tag, path in blocks.items():
+        pem = _read_pem(path)
+        content = re.sub(
+            rf"<{tag}>\s*</{tag}>", lambda _: f"<{tag}>\n{pem}\n</{tag}>", content
+        )
+    return content
+
+
+class _ArchiveWriter:
+    def __init__(self, path: str):
+        self.path = path
+        if not path.endswith((".zip", ".tar.gz", ".tgz", ".tar")):
+            raise ValueError(f"Unsupported archive format: {path} (use .zip, .tar or .tgz)")
+        # The profiles hold client private keys, so only the owner may read them
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        os.fchmod(fd, 0o600)
+        self.file = os.fdopen(fd, "wb")
+        if path.endswith(".zip"):
+            self.archive = zipfile.ZipFile(self.file, "w", zipfile.ZIP_DEFLATED)
+        elif path.endswith(".tar"):
+            self.archive = tarfile.open(fileobj=self.file, mode="w")
+        else:
+            self.archive = tarfile.open(fileobj=self.file, mode="w:gz")
+
+    def add(self, name: str, content: str) -> None:
+        data = content.encode()
+        if isinstance(self.archive, zipfile.ZipFile):
+            info = zipfile.ZipInfo(name, time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.external_attr = 0o100600 << 16
+            self.archive.writestr(info, data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            info.mode = 0o600
+            self.archive.addfile(info, io.BytesIO(data))
+
+    def close(self) -> None:
+        self.archive.close()
+        self.file.close()
+
+
+def issue_clients(
+    docker: DockerManager,
+    vpn_name: str,
+    csv_path: str,
+    output: str = None,
+    workers: int = None,
+) -> str:
+    vpn_path = get_config_path(vpn_name)
+    if not os.path.exists(vpn_path):
+        raise Exception(f"VPN {vpn_name} not found")
+    if not docker.get_container(f"{vpn_name}-ui"):
+        raise Exception(f"Container {vpn_name}-ui not found")
+
+    names = read_client_names(csv_path)
+    if not names:
+        raise Exception(f"No client names found in {csv_path}")
+
+    if not output:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output = f"{vpn_name}-clients-{timestamp}.zip"
+
+    issued_dir = os.path.join(vpn_path, "pki", "issued")
+    existing = [n for n in names if os.path.exists(os.path.join(issued_dir, f"{n}.crt"))]
+    pending = [n for n in names if n not in existing]
+    workers = workers or os.cpu_count() or 4
+    failed = {}
+    start = time.monotonic()
+
+    # Key and request generation is the expensive part and touches only
+    # per-client files, so it runs in parallel. Signing updates the CA index
+    # and serial and must stay sequential.
+    requested = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(_easyrsa, docker, vpn_name, "gen-req", name, "nopass"): name
+            for name in pending
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                future.result()
+                requested.append(name)
+            except Exception as e:
+                failed[name] = str(e)
+    keys_elapsed = time.monotonic() - start
+
+    for name in [n for n in pending if n in requested]:
+        try:
+            _easyrsa(docker, vpn_name, "sign-req", "client", name)
+        except Exception as e:
+            failed[name] = str(e)
+
+    clients_dir = os.path.join(vpn_path, "clients")
+    os.makedirs(clients_dir, mode=0o700, exist_ok=True)
+    archive = _ArchiveWriter(output)
+    exported = 0
+    try:
+        for name in names:
+            if name in failed:
+                continue
+            try:
+                content = render_ovpn(vpn_path, name)
+            except FileNotFoundError as e:
+                failed[name] = f"Missing PKI file {e.filename}"
+                continue
+            atomic_write(os.path.join(clients_dir, f"{name}.ovpn"), content, mode=0o600)
+            archive.add(f"{vpn_name}/{name}.ovpn", content)
+            exported += 1
+    finally:
+        archive.close()
+
+    elapsed = time.monotonic() - start
+    issued = len([n for n in pending if n not in failed])
+    print(f"\n======= Clients issued for {vpn_name} =======")
+    print(f"Issued: {issued}, already existing: {len(existing)}, failed: {len(failed)}")
+    if issued:
+        print(f"Key generation: {keys_elapsed:.1f}s with {workers} workers")
+        print(f"Throughput: {issued / elapsed:.1f} clients/s ({elapsed:.1f}s total)")
+    print(f"Profiles exported: {exported} -> {output}")
+    for name, error in failed.items():
+        print(f"- {name}: {error}")
+
+    return output
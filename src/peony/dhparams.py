@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+import os
+import sys
+import time
+import fcntl
+import shutil
+import argparse
+import subprocess
+from typing import Optional
+
+try:
+    from peony.images import read_pinned_images
+    from peony.utils import get_config_path, read_settings
+except (ImportError, ModuleNotFoundError):
+    from images import read_pinned_images
+    from utils import get_config_path, read_settings
+
+
+DEFAULT_POOL_SIZE = 2
+
+
+def get_dh_pool_path(key_size: str = None) -> str:
+    base_path = os.path.join(os.path.dirname(get_config_path()), "dhparams")
+    return os.path.join(base_path, str(key_size)) if key_size else base_path
+
+
+def get_pool_size(config: dict, key_size: str) -> int:
+    value = config.get(f"dh_pool_size_{key_size}") or config.get("dh_pool_size")
+    return int(value) if value else DEFAULT_POOL_SIZE
+
+
+def list_pool(key_size: str) -> list:
+    pool_dir = get_dh_pool_path(key_size)
+    if not os.path.exists(pool_dir):
+        return []
+    return sorted(
+        os.path.join(pool_dir, f)
+        for f in os.listdir(pool_dir)
+        if f.startswith("dh-") and f.endswith(".pem")
+    )
+
+
+def take_dh_params(key_size: str, target: str) -> bool:
+    for path in list_pool(key_size):
+        claimed = f"{path}.claimed-{os.getpid()}"
+        try:
+            # rename is atomic, so two concurrent creates never share a file
+            os.rename(path, claimed)
+        except FileNotFoundError:
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.move(claimed, target)
+        return True
+    return False
+
+
+def _generate_dh(key_size: str, output: str) -> None:
+    if shutil.which("openssl"):
+        cmd = ["nice", "-n", "19", "openssl", "dhparam", "-out", output, str(key_size)]
+    else:
+        image = read_pinned_images()["openvpn_image"]
+        cmd = [
+            "docker", "run", "--rm", "--entrypoint", "openssl",
+            "-v", f"{os.path.dirname(output)}:/out",
+            image, "dhparam", "-out", f"/out/{os.path.basename(output)}", str(key_size),
+        ]
+    result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if result.returncode != 0 or not os.path.exists(output):
+        raise Exception(f"Failed to generate {key_size} bits DH parameters")
+
+
+def fill_pool(key_size: str, size: int) -> int:
+    pool_dir = get_dh_pool_path(key_size)
+    os.makedirs(pool_dir, exist_ok=True)
+
+    with open(os.path.join(pool_dir, ".lock"), "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            print(f"Pool {pool_dir} is already being filled")
+            return 0
+
+        generated = 0
+        while len(list_pool(key_size)) < size:
+            timestamp = time.strftime("%Y%m%d_%H%M%S")
+            tmp_path = os.path.join(pool_dir, f".tmp-{timestamp}-{os.getpid()}.pem")
+            try:
+                _generate_dh(key_size, tmp_path)
+                # Fast generations can finish in the same second as the previous one
+                name = f"dh-{timestamp}.pem"
+                counter = 1
+                while os.path.exists(os.path.join(pool_dir, name)):
+                    name = f"dh-{timestamp}-{counter}.pem"
+                    counter += 1
+                os.replace(tmp_path, os.path.join(pool_dir, name))
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            generated += 1
+        return generated
+
+
+def spawn_background_fill(key_size: str) -> None:
+    log_path = os.path.join(get_dh_pool_path(), "fill.log")
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    with open(log_path, "a") as log:
+        subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "fill", "--key-size", str(key_size)],
+            stdout=log,
+            stderr=log,
+            start_new_session=True,
+        )
+
+
+def _read_config() -> dict:
+    try:
+        return read_settings("vpn_settings")
+    except Exception:
+        return {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the pre-generated DH parameters pool")
+    parser.add_argument("action", choices=["fill", "status"])
+    parser.add_argument("--key-size", help="DH key size in bits (default: EASYRSA_KEY_SIZE)")
+    parser.add_argument("--size", type=int, help="Number of DH parameter sets to keep")
+    args = parser.parse_args()
+
+    try:
+        config = _read_config()
+        key_size = args.key_size or config.get("easyrsa_key_size") or "4096"
+        size = args.size if args.size is not None else get_pool_size(config, key_size)
+
+        if args.action == "status":
+            print(f"DH pool {key_size} bits: {len(list_pool(key_size))}/{size} available")
+            return
+
+        start = time.monotonic()
+        generated = fill_pool(key_size, size)
+        print(
+            f"Generated {generated} DH parameter sets ({key_size} bits) "
+            f"in {time.monotonic() - start:.1f}s"
+        )
+
+    except Exception as e:
+        print(f"Error: {e}")
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,41 @@
 import os
 import docker
 from typing import Set, Optional
+from urllib.parse import urlparse
 from docker.errors import NotFound
+from docker.utils import kwargs_from_env
+
+LOCAL_HOST = "local"
+VPN_MEMORY_ESTIMATE = 64 * 1024 * 1024
 
 
 class DockerManager:
-    def __init__(self):
-        self.client = docker.from_env()
+    def __init__(self, base_url: str = None, host_name: str = LOCAL_HOST):
+        self.base_url = base_url
+        self.host_name = host_name
+        if not base_url:
+            self.client = docker.from_env()
+        elif base_url.startswith("ssh://"):
+            # The system ssh client honours ~/.ssh/config and agents, unlike paramiko
+            self.client = docker.DockerClient(base_url=base_url, use_ssh_client=True)
+        elif base_url.startswith("tcp://"):
+            tls = kwargs_from_env().get("tls", False)
+            self.client = docker.DockerClient(base_url=base_url, tls=tls)
+        else:
+            self.client = docker.DockerClient(base_url=base_url)
+
+    @property
+    def is_remote(self) -> bool:
+        return self.host_name != LOCAL_HOST
+
+    @property
+    def host_address(self) -> Optional[str]:
+        if not self.base_url or self.base_url.startswith("unix://"):
+            return None
+        return urlparse(self.base_url).hostname
+
+    def cli_env(self) -> str:
+        return f"DOCKER_HOST={self.base_url} " if self.base_url else ""
 
     def get_container(self, name: str) -> Optional[docker.models.containers.Container]:
         try:
@@ -22,6 +51,47 @@ class DockerManager:
         except docker.errors.APIError as e:
             raise Exception(f"Failed to create network: {e}")
 
+    def network_exists(self, name: str) -> bool:
+        try:
+            self.client.networks.get(name)
+            return True
+        except NotFound:
+            return False
+
+    def ensure_network(self, name: str, subnet: str) -> None:
+        if not self.network_exists(name):
+            self.create_network(name, subnet)
+
+    def get_network_subnets(self, suffix: str = "") -> list:
+        subnets = []
+        for network in self.client.networks.list():
+            if network.name.endswith(suffix):
+                for config in (network.attrs.get("IPAM") or {}).get("Config") or []:
+                    if config.get("Subnet"):
+                        subnets.append(config["Subnet"])
+        return subnets
+
+    def remove_network(self, name: str) -> bool:
+        try:
+            self.client.networks.get(name).remove()
+            return True
+        except NotFound:
+            return False
+
+    def get_load(self, start_port: int = 15000, port_range: int = 1000) -> dict:
+        info = self.client.info()
+        used_ports = self.get_used_ports()
+        return {
+            "containers": info.get("ContainersRunning", 0),
+            "cpus": info.get("NCPU") or 1,
+            "memory": info.get("MemTotal") or 0,
+            "free_ports": sum(
+                1
+                for port in range(start_port, start_port + port_range)
+                if port not in used_ports
+            ),
+        }
+
     def remove_container(self, name: str) -> None:
         container = self.get_container(name)
         if container:
@@ -64,8 +134,37 @@ class DockerManager:
         return None
 
 
+    def exec_in_container(self, name: str, command: list) -> str:
+        container = self.get_container(name)
+        if not container:
+            raise Exception(f"Container {name} not found")
+        exit_code, output = container.exec_run(command)
+        output = output.decode(errors="replace") if output else ""
+        if exit_code != 0:
+            raise Exception(f"Command failed in {name} ({exit_code}): {output.strip()}")
+        return output
+
+    def run_oneshot(
+        self, image: str, command: list, volumes: dict, entrypoint: str = None
+    ) -> str:
+        try:
+            output = self.client.containers.run(
+                image,
+                command,
+                entrypoint=entrypoint,
+                volumes=volumes,
+                remove=True,
+                stdout=True,
+                stderr=True,
+            )
+            return output.decode(errors="replace") if output else ""
+        except docker.errors.ContainerError as e:
+            raise Exception(f"One-shot container failed: {e}")
+        except docker.errors.APIError as e:
+            raise Exception(f"Failed to run one-shot container: {e}")
+
     def start_compose(self, compose_file: str) -> None:
-        if os.system(f"docker compose -f {compose_file} up -d") != 0:
+        if os.system(f"{self.cli_env()}docker compose -f {compose_file} up -d") != 0:
             raise Exception("Failed to start docker-compose")
 
     def check_for_vpns(self, caddy_name: str) -> tuple[bool, list]:
@@ -0,0 +1,138 @@
+import os
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from peony.docker_manager import DockerManager, LOCAL_HOST, VPN_MEMORY_ESTIMATE
+    from peony.async_docker_manager import AsyncDockerManager
+    from peony.utils import get_config_path, read_settings, read_vpn_list
+except (ImportError, ModuleNotFoundError):
+    from docker_manager import DockerManager, LOCAL_HOST, VPN_MEMORY_ESTIMATE
+    from async_docker_manager import AsyncDockerManager
+    from utils import get_config_path, read_settings, read_vpn_list
+
+
+HOST_FILE = ".peony-host"
+
+
+def _resolve_context(name: str) -> str:
+    result = subprocess.run(
+        ["docker", "context", "inspect", name, "--format", "{{.Endpoints.docker.Host}}"],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0 or not result.stdout.strip():
+        raise Exception(f"Docker context {name} not found")
+    return result.stdout.strip()
+
+
+def parse_docker_hosts(value: str) -> dict:
+    hosts = {}
+    for entry in (value or "").split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        name, _, url = entry.partition("=")
+        name = name.strip()
+        if name == LOCAL_HOST:
+            hosts[name] = url.strip() or None
+        else:
+            hosts[name] = url.strip() or _resolve_context(name)
+    return hosts or {LOCAL_HOST: None}
+
+
+def choose_host(loads: dict) -> str:
+    candidates = {host: load for host, load in loads.items() if load["free_ports"] > 0}
+    if not candidates:
+        raise Exception("No Docker host has free VPN ports left")
+
+    def score(host: str) -> tuple:
+        load = candidates[host]
+        containers = load["containers"] + 1
+        cpu = containers / load["cpus"]
+        memory = containers * VPN_MEMORY_ESTIMATE / load["memory"] if load["memory"] else cpu
+        return (max(cpu, memory), -load["free_ports"], host)
+
+    return min(candidates, key=score)
+
+
+class DockerFleet:
+    def __init__(self, hosts: dict = None):
+        self.hosts = hosts or {LOCAL_HOST: None}
+        self._managers = {}
+
+    @classmethod
+    def from_settings(cls) -> "DockerFleet":
+        try:
+            config = read_settings("vpn_settings")
+        except Exception:
+            config = {}
+        return cls(parse_docker_hosts(config.get("docker_hosts")))
+
+    @property
+    def is_multi_host(self) -> bool:
+        return list(self.hosts) != [LOCAL_HOST]
+
+    def get(self, host: str) -> DockerManager:
+        if host not in self._managers:
+            if host != LOCAL_HOST and host not in self.hosts:
+                raise Exception(f"Unknown Docker host {host} (check DOCKER_HOSTS)")
+            self._managers[host] = DockerManager(self.hosts.get(host), host)
+        return self._managers[host]
+
+    @property
+    def local(self) -> DockerManager:
+        return self.get(LOCAL_HOST)
+
+    def host_of(self, vpn_name: str) -> str:
+        try:
+            with open(os.path.join(get_config_path(vpn_name), HOST_FILE)) as f:
+                return f.read().strip() or LOCAL_HOST
+        except FileNotFoundError:
+            return LOCAL_HOST
+
+    def for_vpn(self, vpn_name: str) -> DockerManager:
+        return self.get(self.host_of(vpn_name))
+
+    def async_managers(self, concurrency: int = 8) -> dict:
+        managers = {
+            host: AsyncDockerManager(concurrency=concurrency, base_url=url)
+            for host, url in self.hosts.items()
+        }
+        managers.setdefault(LOCAL_HOST, AsyncDockerManager(concurrency=concurrency))
+        return managers
+
+    def _get_load(self, host: str) -> dict:
+        return self.get(host).get_load()
+
+    def get_loads(self) -> dict:
+        with ThreadPoolExecutor(max_workers=len(self.hosts)) as executor:
+            # Connecting happens in the worker too, so an unreachable host only warns
+            futures = {host: executor.submit(self._get_load, host) for host in self.hosts}
+        loads = {}
+        for host, future in futures.items():
+            try:
+                loads[host] = future.result()
+            except Exception as e:
+                print(f"⚠️  Warning: Docker host {host} unavailable: {e}")
+        return loads
+
+    def place(self) -> DockerManager:
+        if not self.is_multi_host:
+            return self.local
+        host = choose_host(self.get_loads())
+        print(f"Placing VPN on Docker host {host}")
+        return self.get(host)
+
+    def check_for_vpns(self, caddy_name: str) -> tuple[bool, list]:
+        vpns = set()
+        for host in self.hosts:
+            try:
+                vpns.update(self.get(host).check_for_vpns(caddy_name)[1])
+            except Exception as e:
+                # VPN files live on this machine whatever the host, so the
+                # VPNs recorded on an unreachable host are still listed
+                recorded = [v for v in read_vpn_list(caddy_name) if self.host_of(v) == host]
+                print(f"⚠️  Warning: Docker host {host} unreachable ({e}), using recorded VPNs: {', '.join(recorded) or 'none'}")
+                vpns.update(recorded)
+        return bool(vpns), sorted(vpns)
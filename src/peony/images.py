@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+import os
+import re
+import time
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from peony.async_docker_manager import AsyncDockerManager
+    from peony.hosts import DockerFleet
+    from peony.services import pin_service_images, read_services, start_project
+    from peony.utils import (
+        get_config_path,
+        find_caddy_server,
+        read_vpn_list,
+        atomic_write,
+        positive_int,
+    )
+except (ImportError, ModuleNotFoundError):
+    from async_docker_manager import AsyncDockerManager
+    from hosts import DockerFleet
+    from services import pin_service_images, read_services, start_project
+    from utils import (
+        get_config_path,
+        find_caddy_server,
+        read_vpn_list,
+        atomic_write,
+        positive_int,
+    )
+
+
+VPN_IMAGES = {
+    "openvpn_image": "d3vilh/openvpn-server:latest",
+    "openvpn_ui_image": "d3vilh/openvpn-ui:latest",
+}
+
+
+def get_images_lock_path() -> str:
+    return os.path.join(os.path.dirname(get_config_path()), "images.lock")
+
+
+def read_pinned_images() -> dict:
+    images = dict(VPN_IMAGES)
+    try:
+        with open(get_images_lock_path()) as f:
+            for line in f:
+                if line.strip() and not line.startswith("#"):
+                    key, value = line.split("=", 1)
+                    if key.strip() in images:
+                        images[key.strip()] = value.strip()
+    except FileNotFoundError:
+        pass
+    return images
+
+
+def write_pinned_images(images: dict) -> None:
+    lock_path = get_images_lock_path()
+    tmp_path = f"{lock_path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(f"# Generated by peony-images on {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
+        for key, value in images.items():
+            f.write(f"{key}={value}\n")
+    os.replace(tmp_path, lock_path)
+
+
+def _repository(image: str) -> str:
+    image = image.split("@", 1)[0]
+    name, _, tag = image.rpartition(":")
+    return name if name and "/" not in tag else image
+
+
+async def _pull_and_resolve(docker: AsyncDockerManager, image: str) -> str:
+    await docker.pull_image(image)
+    attrs = await docker.get_image(image)
+    repository = _repository(image)
+    for digest in (attrs or {}).get("RepoDigests", []):
+        if _repository(digest) == repository:
+            return digest
+    raise Exception(f"No registry digest found for {image}")
+
+
+def pull_images(managers: list) -> dict:
+    # Every host pulls the same tags; digests are taken from the first host
+    async def pull_all():
+        return await asyncio.gather(
+            *(
+                _pull_and_resolve(docker, image)
+                for docker in managers
+                for image in VPN_IMAGES.values()
+            )
+        )
+
+    start = time.monotonic()
+    digests = asyncio.run(pull_all())
+    pinned = dict(zip(VPN_IMAGES.keys(), digests[: len(VPN_IMAGES)]))
+    write_pinned_images(pinned)
+
+    print(f"Pulled {len(pinned)} images in {time.monotonic() - start:.1f}s")
+    for key, digest in pinned.items():
+        print(f"- {VPN_IMAGES[key]} -> {digest}")
+    return pinned
+
+
+def pin_compose_images(compose_file: str, images: dict) -> bool:
+    with open(compose_file) as f:
+        content = f.read()
+
+    updated = content
+    for key, image in images.items():
+        repository = re.escape(_repository(VPN_IMAGES[key]))
+        updated = re.sub(
+            rf"(image:\s*){repository}(?:[:@]\S+)?", rf"\g<1>{image}", updated
+        )
+
+    if updated == content:
+        return False
+    atomic_write(compose_file, updated)
+    return True
+
+
+def upgrade_vpns(fleet: DockerFleet, caddy_name: str, concurrency: int = 2) -> None:
+    images = pull_images(list(fleet.async_managers().values()))
+    vpns = read_vpn_list(caddy_name)
+    if not vpns:
+        print("No VPNs configured")
+        return
+
+    def roll(vpn: str) -> tuple[str, float]:
+        start = time.monotonic()
+        compose_file = os.path.join(get_config_path(vpn), "docker-compose.yml")
+        if not os.path.exists(compose_file):
+            raise Exception(f"Compose file {compose_file} not found")
+        if read_services(get_config_path(vpn)):
+            # The compose file is rendered again from the pinned definition
+            pin_service_images(get_config_path(vpn), images, "docker-compose.yml")
+        else:
+            pin_compose_images(compose_file, images)
+        start_project(fleet.for_vpn(vpn), get_config_path(vpn), "docker-compose.yml")
+        return vpn, time.monotonic() - start
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {vpn: executor.submit(roll, vpn) for vpn in vpns}
+        for vpn, future in futures.items():
+            try:
+                _, elapsed = future.result()
+                print(f"- {vpn}: upgraded in {elapsed:.1f}s")
+            except Exception as e:
+                failed.append(vpn)
+                print(f"- {vpn}: failed ({e})")
+
+    if failed:
+        raise Exception(f"Failed to upgrade: {', '.join(failed)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage VPN Docker images")
+    parser.add_argument("action", choices=["pull", "upgrade", "show"])
+    parser.add_argument("--caddy", help="Caddy container name")
+    parser.add_argument(
+        "--concurrency",
+        type=positive_int,
+        default=2,
+        help="Maximum VPNs recreated at the same time during upgrade",
+    )
+    args = parser.parse_args()
+
+    try:
+        if args.action == "show":
+            for key, image in read_pinned_images().items():
+                print(f"{key}: {image}")
+            return
+
+        fleet = DockerFleet.from_settings()
+        if args.action == "pull":
+            pull_images(list(fleet.async_managers().values()))
+            return
+
+        caddy_name = args.caddy or find_caddy_server()
+        if not caddy_name:
+            raise Exception("No Caddy server found. Create one first with peony-caddy")
+        upgrade_vpns(fleet, caddy_name, args.concurrency)
+        print("Upgrade completed !")
+
+    except Exception as e:
+        print(f"Error: {e}")
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
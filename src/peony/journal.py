@@ -0,0 +1,114 @@
+import os
+import json
+import fcntl
+import time
+from typing import Callable, Optional
+
+try:
+    from peony.utils import get_config_path, atomic_write
+except (ImportError, ModuleNotFoundError):
+    from utils import get_config_path, atomic_write
+
+
+def get_journal_path(name: str = None) -> str:
+    journal_dir = os.path.join(os.path.dirname(get_config_path()), "journal")
+    os.makedirs(journal_dir, exist_ok=True)
+    return os.path.join(journal_dir, f"{name}.json") if name else journal_dir
+
+
+def read_journal(name: str) -> Optional[dict]:
+    try:
+        with open(get_journal_path(name)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def list_journals() -> list:
+    journals = []
+    for file in sorted(os.listdir(get_journal_path())):
+        if file.endswith(".json"):
+            journal = read_journal(file[: -len(".json")])
+            if journal:
+                journals.append(journal)
+    return journals
+
+
+class Journal:
+    def __init__(self, operation: str, name: str, verbose: bool = True):
+        self.operation = operation
+        self.name = name
+        self.path = get_journal_path(name)
+        self.steps = []
+        self.data = {}
+        self.resumed = False
+        self.verbose = verbose
+        self._next_step = None
+        self._lock = None
+
+    def __enter__(self) -> "Journal":
+        self._lock = open(f"{self.path}.lock", "w")
+        try:
+            fcntl.flock(self._lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._lock.close()
+            raise Exception(f"Another peony operation is running on VPN {self.name}")
+
+        journal = read_journal(self.name)
+        if journal:
+            if journal["operation"] != self.operation:
+                self._release()
+                raise Exception(
+                    f"VPN {self.name} has an unfinished {journal['operation']} "
+                    f"(last step: {journal['steps'][-1] if journal['steps'] else 'none'}). "
+                    f"Run 'peony-vpn {journal['operation']} {self.name}' to resume it "
+                    f"or 'peony-vpn abort {self.name}' to discard it."
+                )
+            self.steps = journal["steps"]
+            self.data = journal["data"]
+            self.resumed = True
+            if self.verbose:
+                last_step = self.steps[-1] if self.steps else "none"
+                print(f"Resuming {self.operation} of {self.name} after step: {last_step}")
+        else:
+            self.save()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            os.remove(self.path)
+        elif self.verbose:
+            print(
+                f"\n{self.operation.capitalize()} of {self.name} stopped before step "
+                f"'{self._next_step or 'unknown'}'. Run 'peony-vpn {self.operation} {self.name}' "
+                f"to resume or 'peony-vpn abort {self.name}' to discard it."
+            )
+        self._release()
+
+    def _release(self) -> None:
+        if self._lock:
+            fcntl.flock(self._lock, fcntl.LOCK_UN)
+            self._lock.close()
+            self._lock = None
+
+    def save(self) -> None:
+        journal = {
+            "operation": self.operation,
+            "name": self.name,
+            "steps": self.steps,
+            "data": self.data,
+            "updated": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        atomic_write(self.path, json.dumps(journal, indent=2), mode=0o600)
+
+    def done(self, step: str) -> bool:
+        return step in self.steps
+
+    def run(self, step: str, action: Callable, *args, **kwargs) -> None:
+        if self.done(step):
+            return
+        self._next_step = step
+        action(*args, **kwargs)
+        self.steps.append(step)
+        self._next_step = None
+        self.save()
@@ -0,0 +1,257 @@
+import os
+import re
+import gzip
+import json
+import time
+import fcntl
+from datetime import datetime
+from typing import Optional
+
+try:
+    from peony.utils import get_config_path, atomic_write
+except (ImportError, ModuleNotFoundError):
+    from utils import get_config_path, atomic_write
+
+
+ARCHIVE_DIR = "archive"
+INDEX_FILE = "index.json"
+# Rewritten in place by OpenVPN every few seconds, never rotated
+SKIPPED_LOGS = {"openvpn-status.log"}
+
+LOG_DEFAULTS = {
+    "log_rotate_size": "10M",
+    "log_rotate_age": "1d",
+    "log_retention": "30d",
+    "log_backup_history": "",
+}
+
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3}
+DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_size(value: str) -> int:
+    match = re.fullmatch(r"(\d+)([KMG]?)", value.strip().upper())
+    if not match:
+        raise ValueError(f"Invalid size: {value} (e.g. 500K, 10M, 1G)")
+    return int(match.group(1)) * SIZE_UNITS[match.group(2)]
+
+
+def parse_duration(value: str) -> int:
+    match = re.fullmatch(r"(\d+)([smhd])", value.strip().lower())
+    if not match:
+        raise ValueError(f"Invalid duration: {value} (e.g. 12h, 7d)")
+    return int(match.group(1)) * DURATION_UNITS[match.group(2)]
+
+
+def parse_timestamp(line: str) -> Optional[float]:
+    # OpenVPN 2.5+ writes "2024-05-01 10:00:00 ...", older versions a ctime date
+    for length, fmt in ((19, "%Y-%m-%d %H:%M:%S"), (24, "%a %b %d %H:%M:%S %Y")):
+        try:
+            return datetime.strptime(line[:length], fmt).timestamp()
+        except ValueError:
+            continue
+    return None
+
+
+def parse_time(value: str) -> float:
+    # Either a duration relative to now ("2h") or a date ("2024-05-01 10:00")
+    try:
+        return time.time() - parse_duration(value)
+    except ValueError:
+        pass
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(value.strip(), fmt).timestamp()
+        except ValueError:
+            continue
+    raise ValueError(f"Invalid time: {value} (e.g. 2h, 2024-05-01 or '2024-05-01 10:00')")
+
+
+def get_log_path(vpn_name: str) -> str:
+    return os.path.join(get_config_path(vpn_name), "log")
+
+
+def _archive_path(vpn_name: str, file: str = None) -> str:
+    archive_dir = os.path.join(get_log_path(vpn_name), ARCHIVE_DIR)
+    return os.path.join(archive_dir, file) if file else archive_dir
+
+
+def read_index(vpn_name: str) -> list:
+    try:
+        with open(_archive_path(vpn_name, INDEX_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+
+def _write_index(vpn_name: str, index: list) -> None:
+    atomic_write(_archive_path(vpn_name, INDEX_FILE), json.dumps(index, indent=2))
+
+
+def _first_timestamp(path: str) -> Optional[float]:
+    with open(path, errors="replace") as f:
+        # Logs without timestamps are not read to the end on every run
+        for line, _ in zip(f, range(100)):
+            line_time = parse_timestamp(line)
+            if line_time:
+                return line_time
+    return None
+
+
+def _rotate_file(vpn_name: str, log_file: str) -> dict:
+    source = os.path.join(get_log_path(vpn_name), log_file)
+    archive_dir = _archive_path(vpn_name)
+    os.makedirs(archive_dir, exist_ok=True)
+
+    start = end = None
+    lines = 0
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    segment = f"{log_file}.{timestamp}.gz"
+    counter = 1
+    while os.path.exists(os.path.join(archive_dir, segment)):
+        segment = f"{log_file}.{timestamp}-{counter}.gz"
+        counter += 1
+    tmp_path = os.path.join(archive_dir, f".{segment}")
+
+    # copytruncate: OpenVPN keeps the file open, so copy it then truncate in place
+    with open(source, "rb") as src, gzip.open(tmp_path, "wb") as dst:
+        for line in src:
+            dst.write(line)
+            lines += 1
+            line_time = parse_timestamp(line.decode(errors="replace"))
+            if line_time:
+                start = start or line_time
+                end = line_time
+    os.truncate(source, 0)
+    os.replace(tmp_path, os.path.join(archive_dir, segment))
+
+    now = time.time()
+    return {
+        "file": segment,
+        "source": log_file,
+        "start": start or os.path.getmtime(source),
+        "end": end or now,
+        "lines": lines,
+        "size": os.path.getsize(os.path.join(archive_dir, segment)),
+        "rotated": now,
+    }
+
+
+def rotate_logs(vpn_name: str, config: dict, force: bool = False) -> dict:
+    log_path = get_log_path(vpn_name)
+    if not os.path.exists(log_path):
+        raise Exception(f"Log directory {log_path} not found")
+
+    settings = {**LOG_DEFAULTS, **{k: v for k, v in config.items() if k in LOG_DEFAULTS}}
+    max_size = parse_size(settings["log_rotate_size"])
+    max_age = parse_duration(settings["log_rotate_age"])
+    retention = parse_duration(settings["log_retention"])
+
+    os.makedirs(_archive_path(vpn_name), exist_ok=True)
+    # Cron and manual rotations of the same VPN run one after the other
+    with open(_archive_path(vpn_name, ".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        return _rotate_all(vpn_name, log_path, max_size, max_age, retention, force)
+
+
+def _rotate_all(
+    vpn_name: str, log_path: str, max_size: int, max_age: int, retention: int, force: bool
+) -> dict:
+    index = read_index(vpn_name)
+    now = time.time()
+    rotated = 0
+
+    for log_file in sorted(os.listdir(log_path)):
+        path = os.path.join(log_path, log_file)
+        if log_file in SKIPPED_LOGS or not log_file.endswith(".log") or not os.path.isfile(path):
+            continue
+        size = os.path.getsize(path)
+        if not size:
+            continue
+        # Every append refreshes ctime and mtime, so a log never rotated is
+        # aged from its first entry
+        last_rotation = max(
+            (s["rotated"] for s in index if s["source"] == log_file),
+            default=None,
+        ) or _first_timestamp(path) or os.path.getctime(path)
+        if force or size >= max_size or now - last_rotation >= max_age:
+            index.append(_rotate_file(vpn_name, log_file))
+            rotated += 1
+
+    expired = [s for s in index if now - s["end"] > retention]
+    for segment in expired:
+        try:
+            os.remove(_archive_path(vpn_name, segment["file"]))
+        except FileNotFoundError:
+            pass
+    index = [s for s in index if s not in expired]
+
+    if rotated or expired:
+        _write_index(vpn_name, index)
+    return {"rotated": rotated, "expired": len(expired), "segments": len(index)}
+
+
+def read_logs(
+    vpn_name: str, since: float = None, until: float = None, source: str = "openvpn.log"
+):
+    index = read_index(vpn_name)
+    segments = [
+        s
+        for s in sorted(index, key=lambda s: s["start"])
+        if s["source"] == source
+        and (since is None or s["end"] >= since)
+        and (until is None or s["start"] <= until)
+    ]
+
+    def in_range(line: str, current: Optional[float]) -> bool:
+        line_time = parse_timestamp(line) or current
+        if line_time is None:
+            return True
+        return (since is None or line_time >= since) and (until is None or line_time <= until)
+
+    # Only segments overlapping the range are decompressed
+    paths = [(_archive_path(vpn_name, s["file"]), gzip.open) for s in segments]
+    paths.append((os.path.join(get_log_path(vpn_name), source), open))
+
+    for path, opener in paths:
+        if not os.path.exists(path):
+            continue
+        current = None
+        with opener(path, "rt", errors="replace") as f:
+            for line in f:
+                current = parse_timestamp(line) or current
+                if in_range(line, current):
+                    yield line
+                elif until is not None and current is not None and current > until:
+                    break
+
+
+def backup_excludes(vpn_name: str, history: str) -> list:
+    log_path = get_log_path(vpn_name).lstrip("/")
+    if not history or history.strip() == "all":
+        return []
+    if history.strip() == "0":
+        return [log_path]
+
+    cutoff = time.time() - parse_duration(history)
+    return [
+        os.path.join(log_path, ARCHIVE_DIR, s["file"])
+        for s in read_index(vpn_name)
+        if s["end"] < cutoff
+    ]
+
+
+def print_log_status(vpn_name: str) -> None:
+    index = read_index(vpn_name)
+    log_path = get_log_path(vpn_name)
+    active = sum(
+        os.path.getsize(os.path.join(log_path, f))
+        for f in os.listdir(log_path)
+        if os.path.isfile(os.path.join(log_path, f))
+    ) if os.path.exists(log_path) else 0
+    archived = sum(s["size"] for s in index)
+
+    print(f"- {vpn_name}: active {active / 1024:.0f} KiB, {len(index)} segments ({archived / 1024:.0f} KiB)")
+    if index:
+        oldest = datetime.fromtimestamp(min(s["start"] for s in index))
+        print(f"  oldest entry: {oldest:%Y-%m-%d %H:%M:%S}")
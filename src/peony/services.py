@@ -0,0 +1,319 @@
+import os
+import json
+import time
+import hashlib
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from docker.errors import APIError, ImageNotFound
+
+try:
+    from peony.docker_manager import DockerManager
+    from peony.utils import atomic_write
+except (ImportError, ModuleNotFoundError):
+    from docker_manager import DockerManager
+    from utils import atomic_write
+
+
+SERVICES_FILE = ".peony-services.json"
+CONFIG_HASH_LABEL = "peony.config-hash"
+
+
+def vpn_services(context: dict) -> dict:
+    volume_path = context["volume_path"]
+    ui_ports = {"8080/tcp": int(context["ui_port"])} if context.get("ui_port") else {}
+    return {
+        "services": {
+            "openvpn": {
+                "container_name": context["container_name"],
+                "image": context["openvpn_image"],
+                "privileged": True,
+                "ports": {f"1194/{context['protocol']}": int(context["vpn_port"])},
+                "networks": ["vpn"],
+                "environment": {
+                    "TRUST_SUB": f"{context['trust_subnet']}/24",
+                    "GUEST_SUB": f"{context['guest_subnet']}/24",
+                    "HOME_SUB": f"{context['home_subnet']}/24",
+                },
+                "volumes": [
+                    f"{volume_path}/pki:/etc/openvpn/pki",
+                    f"{volume_path}/clients:/etc/openvpn/clients",
+                    f"{volume_path}/config:/etc/openvpn/config",
+                    f"{volume_path}/staticclients:/etc/openvpn/staticclients",
+                    f"{volume_path}/log:/var/log/openvpn",
+                    f"{volume_path}/fw-rules.sh:/opt/app/fw-rules.sh",
+                    f"{volume_path}/checkpsw.sh:/opt/app/checkpsw.sh",
+                    f"{volume_path}/server.conf:/etc/openvpn/server.conf",
+                ],
+                "cap_add": ["NET_ADMIN"],
+                "restart": "always",
+                "depends_on": ["openvpn-ui"],
+            },
+            "openvpn-ui": {
+                "container_name": context["container_name_ui"],
+                "image": context["openvpn_ui_image"],
+                "privileged": True,
+                "ports": ui_ports,
+                "networks": ["vpn", "vpn-proxy"],
+                "environment": {
+                    "OPENVPN_ADMIN_USERNAME": "admin",
+                    "OPENVPN_ADMIN_PASSWORD": context["admin_password"],
+                },
+                "volumes": [
+                    f"{volume_path}/:/etc/openvpn",
+                    f"{volume_path}/db:/opt/openvpn-ui/db",
+                    f"{volume_path}/pki:/usr/share/easy-rsa/pki",
+                ],
+                "restart": "always",
+            },
+        },
+        "networks": {
+            "vpn": {"name": f"{context['container_name']}-net", "external": True},
+            "vpn-proxy": {"name": "vpn-proxy", "external": True},
+        },
+    }
+
+
+def caddy_services(name: str, output_dir: str, subnet: str = "172.28.0.0/24") -> dict:
+    return {
+        "services": {
+            "caddy": {
+                "container_name": name,
+                "image": "caddy:latest",
+                "restart": "always",
+                "cap_add": ["NET_ADMIN"],
+                "ports": {"80/tcp": 80, "443/tcp": 443, "443/udp": 443},
+                "networks": ["vpn-proxy"],
+                "volumes": [
+                    f"{output_dir}/Caddyfile:/etc/caddy/Caddyfile",
+                    f"{output_dir}/static:/www/static",
+                    f"{output_dir}/data:/data",
+                    f"{output_dir}/config:/config",
+                ],
+            },
+        },
+        "networks": {
+            "vpn-proxy": {"name": "vpn-proxy", "subnet": subnet},
+        },
+    }
+
+
+def _yaml_scalar(value) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, int):
+        return str(value)
+    # JSON strings are valid YAML double-quoted scalars; $$ stops compose interpolation
+    return json.dumps(str(value).replace("$", "$$"))
+
+
+def _yaml_lines(value, indent: int = 0) -> list:
+    pad = "  " * indent
+    lines = []
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if isinstance(item, (dict, list)):
+                lines.append(f"{pad}{key}:")
+                lines += _yaml_lines(item, indent + 1)
+            else:
+                lines.append(f"{pad}{key}: {_yaml_scalar(item)}")
+    else:
+        for item in value:
+            if isinstance(item, dict):
+                nested = _yaml_lines(item, indent + 1)
+                lines.append(f"{pad}- {nested[0].lstrip()}")
+                lines += nested[1:]
+            else:
+                lines.append(f"{pad}- {_yaml_scalar(item)}")
+    return lines
+
+
+def render_compose(definition: dict) -> str:
+    services = {}
+    for service_name, service in definition["services"].items():
+        compose = {}
+        for key, value in service.items():
+            if key == "ports":
+                value = [f"{host}:{container}" for container, host in value.items()]
+            if value in ([], {}, None, False):
+                continue
+            compose[key] = value
+        services[service_name] = compose
+
+    networks = {}
+    for network_name, network in definition.get("networks", {}).items():
+        if network.get("external"):
+            networks[network_name] = {"name": network["name"], "external": True}
+        else:
+            networks[network_name] = {
+                "driver": "bridge",
+                "name": network["name"],
+                "ipam": {"driver": "default", "config": [{"subnet": network["subnet"]}]},
+            }
+
+    lines = [
+        f"# Generated by peony from {SERVICES_FILE}, which is what containers are started from",
+        *_yaml_lines({"services": services, "networks": networks}),
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def write_services(output_dir: str, definition: dict, compose_file: str) -> None:
+    atomic_write(
+        os.path.join(output_dir, SERVICES_FILE), json.dumps(definition, indent=2), mode=0o600
+    )
+    # The compose file holds the admin password too
+    atomic_write(os.path.join(output_dir, compose_file), render_compose(definition), mode=0o600)
+
+
+def read_services(output_dir: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(output_dir, SERVICES_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def pin_service_images(output_dir: str, images: dict, compose_file: str) -> bool:
+    definition = read_services(output_dir)
+    if not definition:
+        return False
+    keys = {"openvpn": "openvpn_image", "openvpn-ui": "openvpn_ui_image"}
+    changed = False
+    for service_name, key in keys.items():
+        service = definition["services"].get(service_name)
+        if service and key in images and service["image"] != images[key]:
+            service["image"] = images[key]
+            changed = True
+    if changed:
+        write_services(output_dir, definition, compose_file)
+    return changed
+
+
+def _config_hash(service: dict) -> str:
+    return hashlib.sha256(json.dumps(service, sort_keys=True).encode()).hexdigest()
+
+
+def _start_order(services: dict) -> list:
+    waves = []
+    started = set()
+    while len(started) < len(services):
+        wave = [
+            name
+            for name, service in services.items()
+            if name not in started and set(service.get("depends_on", [])) <= started
+        ]
+        if not wave:
+            raise Exception(f"Circular depends_on between services: {', '.join(services)}")
+        waves.append(sorted(wave))
+        started.update(wave)
+    return waves
+
+
+def _ensure_networks(docker: DockerManager, networks: dict) -> None:
+    for network in networks.values():
+        if network.get("external"):
+            if not docker.network_exists(network["name"]):
+                raise Exception(f"Network {network['name']} not found")
+        else:
+            docker.ensure_network(network["name"], network["subnet"])
+
+
+def _create_container(
+    docker: DockerManager, project: str, service_name: str, service: dict, networks: dict
+) -> tuple:
+    name = service["container_name"]
+    config_hash = _config_hash(service)
+    existing = docker.get_container(name)
+    if existing and existing.labels.get(CONFIG_HASH_LABEL) == config_hash:
+        return existing, "unchanged"
+    if existing:
+        existing.remove(force=True)
+
+    network_names = [networks[n]["name"] for n in service.get("networks", [])]
+    endpoint = {
+        network_names[0]: docker.client.api.create_endpoint_config(aliases=[service_name])
+    } if network_names else None
+    kwargs = {
+        "name": name,
+        "environment": service.get("environment"),
+        "ports": service.get("ports") or None,
+        "volumes": service.get("volumes"),
+        "privileged": service.get("privileged", False),
+        "cap_add": service.get("cap_add"),
+        "restart_policy": {"Name": service["restart"]} if service.get("restart") else None,
+        "network": network_names[0] if network_names else None,
+        "networking_config": endpoint,
+        # Compose labels keep `docker compose -f ... ps/logs` working on these containers
+        "labels": {
+            "com.docker.compose.project": project,
+            "com.docker.compose.service": service_name,
+            "com.docker.compose.oneoff": "False",
+            CONFIG_HASH_LABEL: config_hash,
+        },
+    }
+
+    try:
+        container = docker.client.containers.create(service["image"], **kwargs)
+    except ImageNotFound:
+        docker.client.images.pull(service["image"])
+        container = docker.client.containers.create(service["image"], **kwargs)
+    except APIError as e:
+        raise Exception(f"Failed to create container {name}: {e}")
+
+    for network_name in network_names[1:]:
+        docker.client.networks.get(network_name).connect(container, aliases=[service_name])
+    return container, "recreated" if existing else "created"
+
+
+def start_services(docker: DockerManager, definition: dict, project: str) -> dict:
+    services = definition["services"]
+    waves = _start_order(services)
+    _ensure_networks(docker, definition.get("networks", {}))
+
+    def create(service_name: str) -> tuple:
+        start = time.monotonic()
+        container, action = _create_container(
+            docker, project, service_name, services[service_name], definition.get("networks", {})
+        )
+        return container, action, time.monotonic() - start
+
+    def start(container) -> float:
+        begin = time.monotonic()
+        container.reload()
+        if container.status != "running":
+            container.start()
+        return time.monotonic() - begin
+
+    # Creating a container does not depend on others running, so every
+    # service is created at once; only starts follow depends_on
+    results = {}
+    with ThreadPoolExecutor(max_workers=len(services)) as executor:
+        created = dict(zip(services, executor.map(create, services)))
+        for wave in waves:
+            durations = executor.map(start, [created[name][0] for name in wave])
+            for name, duration in zip(wave, durations):
+                container, action, create_time = created[name]
+                results[container.name] = {
+                    "action": action,
+                    "create": create_time,
+                    "start": duration,
+                }
+    return results
+
+
+def start_project(docker: DockerManager, output_dir: str, compose_file: str) -> None:
+    definition = read_services(output_dir)
+    if not definition:
+        # Directories rendered before the native engine only have the compose file
+        docker.start_compose(os.path.join(output_dir, compose_file))
+        return
+
+    project = os.path.basename(os.path.normpath(output_dir)).lower()
+    start = time.monotonic()
+    results = start_services(docker, definition, project)
+    for name, result in results.items():
+        print(
+            f"- {name}: {result['action']} in {result['create']:.2f}s, "
+            f"started in {result['start']:.2f}s"
+        )
+    print(f"Containers ready in {time.monotonic() - start:.2f}s")
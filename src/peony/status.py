@@ -0,0 +1,145 @@
+import os
+import json
+import time
+import asyncio
+from typing import Optional
+
+try:
+    from peony.hosts import DockerFleet
+    from peony.logs import get_log_path
+    from peony.utils import get_caddy_path, read_vpn_list, atomic_write
+except (ImportError, ModuleNotFoundError):
+    from hosts import DockerFleet
+    from logs import get_log_path
+    from utils import get_caddy_path, read_vpn_list, atomic_write
+
+
+STATUS_FILE = "vpn-status.json"
+# OpenVPN rewrites its status file every 60s; older than this it is probably hung
+STATUS_FILE_MAX_AGE = 300
+
+STATUS_DEFAULTS = {
+    "status_interval": "30",
+    "status_recommend": "true",
+    "status_hide_unhealthy": "false",
+}
+
+
+def count_clients(vpn_name: str) -> tuple[Optional[int], Optional[float]]:
+    path = os.path.join(get_log_path(vpn_name), "openvpn-status.log")
+    try:
+        with open(path) as f:
+            lines = f.read().splitlines()
+        updated = os.path.getmtime(path)
+    except FileNotFoundError:
+        return None, None
+
+    # status-version 2 and 3 prefix each client with CLIENT_LIST
+    if any(line.startswith("HEADER") for line in lines):
+        return sum(1 for line in lines if line.startswith("CLIENT_LIST")), updated
+
+    # status-version 1: one line per client between the header and ROUTING TABLE
+    clients = 0
+    in_list = False
+    for line in lines:
+        if line.startswith("Common Name,"):
+            in_list = True
+        elif line.startswith("ROUTING TABLE"):
+            break
+        elif in_list and line.strip():
+            clients += 1
+    return clients, updated
+
+
+def _container_state(attrs) -> str:
+    if isinstance(attrs, Exception):
+        return "unreachable"
+    if not attrs:
+        return "missing"
+    state = attrs["State"]
+    if state["Status"] != "running":
+        return state["Status"]
+    return state.get("Health", {}).get("Status") or "running"
+
+
+def _vpn_status(vpn_name: str, server, ui, now: float) -> dict:
+    clients, updated = count_clients(vpn_name)
+    state = _container_state(server)
+    ui_state = _container_state(ui)
+    if state in ("running", "healthy") and updated and now - updated > STATUS_FILE_MAX_AGE:
+        state = "stale"
+    return {
+        "healthy": state in ("running", "healthy") and ui_state in ("running", "healthy"),
+        "state": state,
+        "ui_state": ui_state,
+        "clients": clients,
+    }
+
+
+def collect_status(
+    fleet: DockerFleet, vpns: list, config: dict, concurrency: int = 8
+) -> dict:
+    hosts = {vpn: fleet.host_of(vpn) for vpn in vpns}
+    managers = fleet.async_managers(concurrency)
+    names = [name for vpn in vpns for name in (vpn, f"{vpn}-ui")]
+
+    async def inspect_all():
+        return await asyncio.gather(
+            *(managers[hosts[name.removesuffix("-ui")]].get_container(name) for name in names),
+            return_exceptions=True,
+        )
+
+    containers = dict(zip(names, asyncio.run(inspect_all())))
+    now = time.time()
+    statuses = {
+        vpn: _vpn_status(vpn, containers[vpn], containers[f"{vpn}-ui"], now)
+        for vpn in vpns
+    }
+
+    recommended = None
+    if config.get("status_recommend", "").lower() == "true":
+        healthy = [vpn for vpn in vpns if statuses[vpn]["healthy"]]
+        if healthy:
+            recommended = min(healthy, key=lambda vpn: statuses[vpn]["clients"] or 0)
+
+    return {
+        "updated": int(now),
+        "interval": int(config["status_interval"]),
+        "recommended": recommended,
+        "hide_unhealthy": config.get("status_hide_unhealthy", "").lower() == "true",
+        "vpns": statuses,
+    }
+
+
+def write_status(caddy_name: str, status: dict) -> str:
+    path = os.path.join(get_caddy_path(caddy_name), "static", STATUS_FILE)
+    atomic_write(path, json.dumps(status, separators=(",", ":")), mode=0o644)
+    return path
+
+
+def update_status(
+    fleet: DockerFleet, caddy_name: str, config: dict, concurrency: int = 8
+) -> dict:
+    status = collect_status(fleet, read_vpn_list(caddy_name), config, concurrency)
+    write_status(caddy_name, status)
+    return status
+
+
+def watch_status(
+    fleet: DockerFleet, caddy_name: str, config: dict, concurrency: int = 8
+) -> None:
+    interval = int(config["status_interval"])
+    # Collection runs on a fixed schedule, so its cost does not depend on page views
+    while True:
+        start = time.monotonic()
+        try:
+            status = update_status(fleet, caddy_name, config, concurrency)
+            healthy = sum(1 for s in status["vpns"].values() if s["healthy"])
+            print(
+                f"{time.strftime('%Y-%m-%d %H:%M:%S')} {healthy}/{len(status['vpns'])} "
+                f"VPNs healthy, recommended: {status['recommended'] or 'none'}",
+                flush=True,
+            )
+        except Exception as e:
+            print(f"⚠️  Warning: status collection failed: {e}", flush=True)
+        time.sleep(max(0, interval - (time.monotonic() - start)))
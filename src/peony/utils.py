@@ -1,9 +1,47 @@
 import os
+import gzip
+import argparse
+import fcntl
+import tempfile
+from contextlib import contextmanager
 from importlib.resources import files
 from importlib import resources
 from pathlib import Path
 import shutil
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CADDY_DEFAULTS = {
+    "caddy_encode": "zstd gzip",
+    "caddy_precompress": "br gzip",
+    "caddy_static_cache": "public, max-age=3600, must-revalidate",
+    "caddy_page_cache": "no-cache",
+    "caddy_ui_cache": "no-store, no-cache, must-revalidate, proxy-revalidate, max-age=0",
+    "proxy_keepalive": "2m",
+    "proxy_keepalive_idle_conns": "32",
+    "proxy_dial_timeout": "3s",
+    "proxy_response_timeout": "60s",
+    "proxy_health_uri": "/login",
+    "proxy_health_interval": "10s",
+    "proxy_health_timeout": "2s",
+    "proxy_fail_duration": "30s",
+    "proxy_max_fails": "1",
+}
+
+PROXY_DURATION_SETTINGS = [
+    "proxy_keepalive",
+    "proxy_dial_timeout",
+    "proxy_response_timeout",
+    "proxy_health_interval",
+    "proxy_health_timeout",
+    "proxy_fail_duration",
+]
+
+PRECOMPRESSED_EXTENSIONS = {"gzip": ".gz", "br": ".br"}
+
 def get_resource_path(resource_path: str) -> str:
     try:
         return str(files('peony').joinpath(resource_path))
@@ -59,6 +97,16 @@ def get_caddy_path(caddy_name: str = None) -> str:
     return os.path.join(base_path, caddy_name) if caddy_name else base_path
 
 
+def read_vpn_list(caddy_name: str) -> list:
+    vpn_select_path = os.path.join(get_caddy_path(caddy_name), "static/vpn-select.html")
+    with open(vpn_select_path, "r") as f:
+        content = f.read()
+    start = content.find("const vpns = [")
+    end = content.find("];", start)
+    vpns_str = content[start:end].replace("const vpns = [", "").strip()
+    return [v.strip(' "') for v in vpns_str.split(",") if v.strip()]
+
+
 def create_vpn_directories(output_dir: str) -> None:
     directories = ["config", "pki", "clients", "db", "staticclients", "log"]
     for dir in directories:
@@ -92,6 +140,13 @@ def find_caddy_server() -> str:
     )
 
 
+def positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+
 def read_settings(file_path: str, defaults: dict = None) -> dict:
     settings = defaults or {}
     
@@ -121,6 +176,66 @@ def read_settings(file_path: str, defaults: dict = None) -> dict:
             
     raise Exception(f"Settings file {file_path} not found in {base_paths}")
 
+def get_precompress_formats(config: dict) -> list:
+    formats = [f for f in config.get("caddy_precompress", "").split() if f]
+    for fmt in formats:
+        if fmt not in PRECOMPRESSED_EXTENSIONS:
+            raise ValueError(f"Invalid caddy_precompress format: {fmt} (should be br or gzip)")
+    if "br" in formats and brotli is None:
+        print("⚠️  Warning: brotli module not installed, skipping br precompression")
+        formats.remove("br")
+    return formats
+
+
+def atomic_write(path: str, content, mode: int = None) -> None:
+    data = content.encode() if isinstance(content, str) else content
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        if mode is not None:
+            os.chmod(tmp_path, mode)
+        elif os.path.exists(path):
+            os.chmod(tmp_path, os.stat(path).st_mode & 0o777)
+        else:
+            os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+@contextmanager
+def caddy_lock(caddy_name: str):
+    lock_path = os.path.join(get_caddy_path(caddy_name), ".peony.lock")
+    with open(lock_path, "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def write_static_file(path: str, content: str, formats: list = None) -> None:
+    data = content.encode()
+    atomic_write(path, data)
+
+    for fmt, extension in PRECOMPRESSED_EXTENSIONS.items():
+        compressed_path = path + extension
+        if fmt not in (formats or []):
+            if os.path.exists(compressed_path):
+                os.remove(compressed_path)
+            continue
+        if fmt == "gzip":
+            compressed = gzip.compress(data, compresslevel=9, mtime=0)
+        else:
+            compressed = brotli.compress(data, quality=11)
+        atomic_write(compressed_path, compressed)
+
+
 def load_template_with_update(template_path: str, context: dict) -> str:
     try:
         full_path = get_resource_path(template_path)
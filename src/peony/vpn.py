@@ -1,58 +1,187 @@
 #!/usr/bin/env python3
 
 import os
+import re
 import argparse
+import ipaddress
 import secrets
 import random
 import string
 import shutil
+import asyncio
+import time
 from datetime import datetime
 
 try:
     from peony.docker_manager import DockerManager
+    from peony.async_docker_manager import get_port_binding
+    from peony.images import read_pinned_images
+    from peony.dhparams import take_dh_params, spawn_background_fill, fill_pool
+    from peony.clients import issue_clients
+    from peony.hosts import DockerFleet, HOST_FILE
+    from peony.backup import snapshot_backup, clone_tree
+    from peony.journal import Journal, read_journal, list_journals
+    from peony.status import update_status, watch_status, STATUS_DEFAULTS
+    from peony.services import vpn_services, write_services, read_services, start_project
+    from peony.caddy import get_caddyfile_directives
+    from peony.logs import (
+        rotate_logs,
+        read_logs,
+        print_log_status,
+        parse_time,
+        parse_size,
+        parse_duration,
+        LOG_DEFAULTS,
+    )
     from peony.utils import (
         get_backup_path,
         get_caddy_path,
         load_template_with_update,
         read_settings,
         find_caddy_server,
+        read_vpn_list,
+        get_precompress_formats,
+        write_static_file,
+        atomic_write,
+        caddy_lock,
+        positive_int,
+        CADDY_DEFAULTS,
+        PROXY_DURATION_SETTINGS,
     )
 except (ImportError, ModuleNotFoundError):
     from docker_manager import DockerManager
+    from async_docker_manager import get_port_binding
+    from images import read_pinned_images
+    from dhparams import take_dh_params, spawn_background_fill, fill_pool
+    from clients import issue_clients
+    from hosts import DockerFleet, HOST_FILE
+    from backup import snapshot_backup, clone_tree
+    from journal import Journal, read_journal, list_journals
+    from status import update_status, watch_status, STATUS_DEFAULTS
+    from services import vpn_services, write_services, read_services, start_project
+    from caddy import get_caddyfile_directives
+    from logs import (
+        rotate_logs,
+        read_logs,
+        print_log_status,
+        parse_time,
+        parse_size,
+        parse_duration,
+        LOG_DEFAULTS,
+    )
     from utils import (
         get_backup_path,
         get_caddy_path,
         load_template_with_update,
         read_settings,
         find_caddy_server,
+        read_vpn_list,
+        get_precompress_formats,
+        write_static_file,
+        atomic_write,
+        caddy_lock,
+        positive_int,
+        CADDY_DEFAULTS,
+        PROXY_DURATION_SETTINGS,
     )
 
 
-def list_vpns(docker: DockerManager, caddy_name: str) -> None:
-    vpns = []
-    caddy_dir = get_caddy_path(caddy_name)
-    vpn_select_path = os.path.join(caddy_dir, "static/vpn-select.html")
+TEMPLATE_FILE = ".peony-template"
+CADDYFILE_SECTIONS = ["    @statusPath {", "    @unavailablePath {", "    handle_errors {"]
+CADDYFILE_ANCHOR = "    @hasNoCookie {"
 
-    with open(vpn_select_path, "r") as f:
-        content = f.read()
-        start = content.find("const vpns = [")
-        end = content.find("];", start)
-        vpns_str = content[start:end].replace("const vpns = [", "").strip()
-        vpns = [v.strip(' "') for v in vpns_str.split(",") if v.strip()]
+
+def list_vpns(fleet: DockerFleet, caddy_name: str, concurrency: int = 8) -> None:
+    vpns = read_vpn_list(caddy_name)
 
     if not vpns:
         print("No VPNs configured")
         return
 
+    hosts = {vpn: fleet.host_of(vpn) for vpn in vpns}
+    managers = fleet.async_managers(concurrency)
+
+    async def inspect_all():
+        return await asyncio.gather(
+            *(managers[hosts[vpn]].get_container(vpn) for vpn in vpns),
+            return_exceptions=True,
+        )
+
+    containers = dict(zip(vpns, asyncio.run(inspect_all())))
+
     print("\n======= Configured VPNs =======")
     for vpn in vpns:
-        container = docker.get_container(vpn)
-        status = container.status.capitalize() if container else "Not found"
-        port = docker.get_container_port(vpn) or "N/A"
-        print(f"- {vpn} (Status: {status}, Port: {port})")
+        attrs = containers[vpn]
+        if isinstance(attrs, Exception):
+            # One unreachable host must not hide the VPNs of the others
+            status, port = f"Unreachable ({attrs})", "N/A"
+        else:
+            status = attrs["State"]["Status"].capitalize() if attrs else "Not found"
+            port = get_port_binding(attrs) or "N/A"
+        host = f", Host: {hosts[vpn]}" if fleet.is_multi_host else ""
+        print(f"- {vpn} (Status: {status}, Port: {port}{host})")
+
+    for journal in list_journals():
+        print(
+            f"\n⚠️  Unfinished {journal['operation']} of {journal['name']} "
+            f"(last step: {journal['steps'][-1] if journal['steps'] else 'none'}, {journal['updated']})"
+        )
+
+
+def manage_logs(action: str, vpns: list, config: dict, args) -> None:
+    if action == "rotate":
+        for vpn_name in vpns:
+            try:
+                result = rotate_logs(vpn_name, config, args.force)
+                print(
+                    f"- {vpn_name}: {result['rotated']} rotated, "
+                    f"{result['expired']} expired, {result['segments']} segments kept"
+                )
+            except Exception as e:
+                print(f"- {vpn_name}: ✗ {e}")
+    elif action == "status":
+        for vpn_name in vpns:
+            print_log_status(vpn_name)
+    else:
+        since = parse_time(args.since) if args.since else None
+        until = parse_time(args.until) if args.until else None
+        for line in read_logs(vpns[0], since, until):
+            print(line, end="")
+
+
+def restart_vpns(fleet: DockerFleet, vpns: list, concurrency: int = 8) -> None:
+    managers = fleet.async_managers(concurrency)
+    by_host = {}
+    for vpn in vpns:
+        by_host.setdefault(fleet.host_of(vpn), []).extend([vpn, f"{vpn}-ui"])
+
+    async def restart_all():
+        results = {}
+        for host_results in await asyncio.gather(
+            *(managers[host].restart_many(names) for host, names in by_host.items())
+        ):
+            results.update(host_results)
+        return results
+
+    results = asyncio.run(restart_all())
+
+    failed = []
+    for vpn in vpns:
+        for name in (vpn, f"{vpn}-ui"):
+            result, elapsed = results[name]
+            if isinstance(result, Exception):
+                failed.append(name)
+                print(f"- {name}: failed ({result})")
+            elif not result:
+                print(f"- {name}: not found")
+            else:
+                print(f"- {name}: restarted in {elapsed:.1f}s")
+
+    if failed:
+        raise Exception(f"Failed to restart: {', '.join(failed)}")
 
 
-def _validate_vpn_settings(config: dict) -> None:
+def _validate_vpn_settings(config: dict, vpn_name: str = None) -> None:
     is_wiw = os.path.exists("/opt/wiw")
     errors = []
 
@@ -91,6 +220,24 @@ def _validate_vpn_settings(config: dict) -> None:
                 f"Invalid easyrsa_crl_days: {days} (should be a positive number)"
             )
 
+    for key, value in config.items():
+        if key.startswith("dh_pool_size") and value:
+            if not value.isdigit():
+                errors.append(
+                    f"Invalid {key}: {value} (should be a positive number or 0)"
+                )
+
+    for key, parse in (
+        ("log_rotate_size", parse_size),
+        ("log_rotate_age", parse_duration),
+        ("log_retention", parse_duration),
+    ):
+        if value := config.get(key):
+            try:
+                parse(value)
+            except ValueError as e:
+                errors.append(f"Invalid {key}: {e}")
+
     if country := config.get("easyrsa_req_country"):
         if not (len(country) == 2 and country.isalpha()):
             errors.append(
@@ -101,6 +248,12 @@ def _validate_vpn_settings(config: dict) -> None:
         if "@" not in email or "." not in email.split("@")[1]:
             errors.append(f"Invalid easyrsa_req_email: {email}")
 
+    if vpn_name:
+        try:
+            _get_proxy_settings(read_settings("caddy_settings", dict(CADDY_DEFAULTS)), vpn_name)
+        except ValueError as e:
+            errors.append(str(e))
+
     if proto := config.get("openvpn_prot"):
         if proto.lower() not in ["udp", "tcp"]:
             errors.append(f"Invalid openvpn_prot: {proto} should be udp or tcp")
@@ -143,6 +296,11 @@ def get_config_path(name: str = None) -> str:
     return os.path.join(base_path, name) if name else base_path
 
 
+def get_template_path(name: str = None) -> str:
+    base_path = os.path.join(os.path.dirname(get_config_path()), "templates")
+    return os.path.join(base_path, name) if name else base_path
+
+
 def _create_vpn_directories(output_dir: str) -> None:
     directories = ["config", "pki", "clients", "db", "staticclients", "log"]
     for dir in directories:
@@ -154,21 +312,19 @@ def _generate_password() -> str:
     return "".join(secrets.choice(characts) for _ in range(random.randint(27, 32)))
 
 
-def calculate_subnets(name: str) -> dict:
+def calculate_subnets(name: str, docker: DockerManager) -> dict:
     if any(c.isdigit() for c in name):
         vpn_num = int("".join(filter(str.isdigit, name)))
         subnet_num = vpn_num * 3 - 2
     else:
         used_subnets = {0}
-        for net in os.popen("docker network ls --format '{{.Name}}'").read().split():
-            if net.endswith("-net"):
-                inspect = os.popen(f"docker network inspect {net}").read()
-                if "Subnet" in inspect and "172.28." in inspect:
-                    subnet = inspect.split("172.28.")[1].split(".")[0]
-                    try:
-                        used_subnets.add(int(subnet))
-                    except ValueError:
-                        continue
+        # Subnets only have to be unique on the Docker host running the VPN
+        for subnet in docker.get_network_subnets("-net"):
+            if subnet.startswith("172.28."):
+                try:
+                    used_subnets.add(int(subnet.split(".")[2]))
+                except ValueError:
+                    continue
         subnet_num = 1
         while (
             subnet_num in used_subnets
@@ -186,20 +342,16 @@ def calculate_subnets(name: str) -> dict:
 
 
 def backup_vpn(docker: DockerManager, caddy_name: str, vpn_name: str) -> None:
-    backup_dir = get_backup_path()
     vpn_path = get_config_path(vpn_name)
 
     if not os.path.exists(vpn_path):
         return
 
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    backup_file = os.path.join(
-        backup_dir, f"{caddy_name}-{vpn_name}-{timestamp}-remove.tgz"
-    )
-    backup_cmd = (
-        f"sudo tar czf {backup_file} -C / opt/docker/volumes/{caddy_name} {vpn_path}"
+    snapshot_backup(
+        f"{caddy_name}-{vpn_name}-{timestamp}-remove",
+        [get_caddy_path(caddy_name), vpn_path],
     )
-    os.system(backup_cmd)
 
 
 def _generate_vpn_context(
@@ -209,7 +361,7 @@ def _generate_vpn_context(
     output_dir: str,
     admin_password: str = None,
 ) -> dict:
-    subnets = calculate_subnets(name)
+    subnets = calculate_subnets(name, docker)
 
     if not admin_password:
         current_port = docker.get_container_port(name)
@@ -224,6 +376,13 @@ def _generate_vpn_context(
     if not hostname:
         raise ValueError("HOSTNAME is mandatory in caddy_settings")
 
+    # Remote hosts publish the UI port so Caddy can reach it across hosts
+    ui_port = None
+    if docker.is_remote:
+        ui_port = docker.get_container_port(f"{name}-ui", 8080) or docker.get_free_port(
+            start_port=18000
+        )
+
     return {
         "container_name": name,
         "container_name_ui": f"{name}-ui",
@@ -232,7 +391,10 @@ def _generate_vpn_context(
         "protocol": config.get("openvpn_prot", "udp"),
         "admin_password": admin_password,
         "hostname": hostname,
+        "vpn_hostname": docker.host_address or hostname,
+        "ui_port": ui_port,
         **subnets,
+        **read_pinned_images(),
         "EASYRSA_DN": "org",
         "EASYRSA_REQ_COUNTRY": config.get("easyrsa_req_country", "FR"),
         "EASYRSA_REQ_PROVINCE": config.get("easyrsa_req_province", "GE"),
@@ -254,12 +416,24 @@ def _generate_vpn_context(
     }
 
 
+def _get_upstream(docker: DockerManager, name: str, context: dict) -> str:
+    if not context.get("ui_port"):
+        return f"{name}-ui:8080"
+    address = docker.host_address
+    if not address:
+        # unix:// daemons run on the Caddy machine, whose published ports Caddy
+        # reaches through the gateway of the vpn-proxy network
+        caddy_config = read_settings("caddy_settings")
+        subnet = caddy_config.get("vpn_docker_subnet") or "172.28.0.0/24"
+        address = next(ipaddress.ip_network(subnet).hosts())
+    return f"{address}:{context['ui_port']}"
+
+
 def _update_vpn_configs(output_dir: str, context: dict) -> None:
     templates = [
         ("server.conf", ""),
         ("client.conf", "config/"),
         ("easy-rsa.vars", "config/"),
-        ("docker-compose.yml", ""),
     ]
 
     for template, subdir in templates:
@@ -267,8 +441,213 @@ def _update_vpn_configs(output_dir: str, context: dict) -> None:
         target_dir = os.path.join(output_dir, subdir)
         os.makedirs(target_dir, exist_ok=True)
         target_path = os.path.join(target_dir, template)
-        with open(target_path, "w") as f:
-            f.write(content)
+        atomic_write(target_path, content)
+
+    write_services(output_dir, vpn_services(context), "docker-compose.yml")
+
+
+def _bootstrap_pki(docker: DockerManager, output_dir: str, context: dict) -> bool:
+    key_size = context["EASYRSA_KEY_SIZE"]
+    dh_dir = os.path.join(output_dir, "dhparams")
+    dh_path = os.path.join(dh_dir, "dh.pem")
+    # VPNs forked from a template already carry DH parameters of the right size
+    if not os.path.exists(dh_path) and not take_dh_params(key_size, dh_path):
+        print(f"No pre-generated {key_size} bits DH parameters available")
+        return False
+
+    # Same steps as the image entrypoint, minus gen-dh. With pki/ca.crt in
+    # place the entrypoint skips its own PKI generation on first boot.
+    script = " && ".join(
+        [
+            "cd /usr/share/easy-rsa",
+            "cp /etc/openvpn/config/easy-rsa.vars ./vars",
+            "export EASYRSA_BATCH=1",
+            "./easyrsa init-pki",
+            "cp ./vars ./pki/vars",
+            "./easyrsa build-ca nopass",
+            "./easyrsa build-server-full server nopass",
+            "./easyrsa gen-crl",
+            "openvpn --genkey secret ./pki/ta.key",
+            "cp /dhparams/dh.pem ./pki/dh.pem",
+            "cp -r ./pki/. /etc/openvpn/pki",
+        ]
+    )
+    try:
+        docker.run_oneshot(
+            context["openvpn_image"],
+            ["-c", script],
+            {
+                os.path.join(output_dir, "pki"): {"bind": "/etc/openvpn/pki", "mode": "rw"},
+                os.path.join(output_dir, "config"): {"bind": "/etc/openvpn/config", "mode": "ro"},
+                dh_dir: {"bind": "/dhparams", "mode": "ro"},
+            },
+            entrypoint="/bin/sh",
+        )
+    except Exception as e:
+        print(f"PKI pre-generation failed, falling back to first boot generation: {e}")
+        os.system(f"sudo rm -rf {os.path.join(output_dir, 'pki')}/*")
+        return False
+    finally:
+        shutil.rmtree(dh_dir, ignore_errors=True)
+    return True
+
+
+def _get_proxy_settings(caddy_config: dict, vpn_name: str) -> dict:
+    settings = {k: v for k, v in caddy_config.items() if "." not in k}
+    prefix = f"{vpn_name.lower()}."
+    for key, value in caddy_config.items():
+        if key.startswith(prefix):
+            settings[key[len(prefix):]] = value
+
+    for key in PROXY_DURATION_SETTINGS:
+        value = settings.get(key)
+        if value and not re.fullmatch(r"\d+(ms|s|m|h)", value):
+            raise ValueError(f"Invalid {key} for {vpn_name}: {value} (e.g. 500ms, 3s, 2m)")
+    for key in ("proxy_max_fails", "proxy_keepalive_idle_conns"):
+        value = settings.get(key)
+        if value and not value.isdigit():
+            raise ValueError(f"Invalid {key} for {vpn_name}: {value} (should be a number)")
+    return settings
+
+
+def _render_reverse_proxy(
+    vpn_name: str, hostname: str, settings: dict, cache_headers: list, upstream: str
+) -> list:
+    lines = [
+        f'header_up X-Forwarded-Host "{hostname}"',
+        'header_up X-Forwarded-Proto "https"',
+        *cache_headers,
+        f'header_down X-Backend-Server "{vpn_name}-backend"',
+    ]
+
+    if settings.get("proxy_fail_duration"):
+        lines.append(f"fail_duration {settings['proxy_fail_duration']}")
+        lines.append(f"max_fails {settings.get('proxy_max_fails') or 1}")
+    if settings.get("proxy_health_uri"):
+        lines.append(f"health_uri {settings['proxy_health_uri']}")
+        for key in ("interval", "timeout"):
+            if settings.get(f"proxy_health_{key}"):
+                lines.append(f"health_{key} {settings[f'proxy_health_{key}']}")
+
+    transport = [
+        f"{directive} {settings[key]}"
+        for key, directive in [
+            ("proxy_dial_timeout", "dial_timeout"),
+            ("proxy_response_timeout", "response_header_timeout"),
+            ("proxy_keepalive", "keepalive"),
+            ("proxy_keepalive_idle_conns", "keepalive_idle_conns_per_host"),
+        ]
+        if settings.get(key)
+    ]
+    if transport:
+        lines += ["transport http {", *(f"    {line}" for line in transport), "}"]
+
+    return [f"reverse_proxy {upstream} {{", *(f"    {l}" for l in lines), "}"]
+
+
+def _render_vpn_proxy(
+    vpn_name: str, hostname: str, caddy_config: dict, upstream: str = None
+) -> str:
+    settings = _get_proxy_settings(caddy_config, vpn_name)
+    upstream = upstream or f"{vpn_name}-ui:8080"
+    encode = settings.get("caddy_encode")
+    static_cache = settings.get("caddy_static_cache")
+    ui_cache = settings.get("caddy_ui_cache") or CADDY_DEFAULTS["caddy_ui_cache"]
+
+    ui_proxy = _render_reverse_proxy(
+        vpn_name,
+        hostname,
+        settings,
+        [
+            f'header_down Cache-Control "{ui_cache}"',
+            'header_down Pragma "no-cache"',
+            'header_down Expires "0"',
+        ],
+        upstream,
+    )
+
+    body = [f"encode {encode}"] if encode else []
+    if static_cache:
+        static_proxy = _render_reverse_proxy(
+            vpn_name,
+            hostname,
+            settings,
+            [
+                f'header_down Cache-Control "{static_cache}"',
+                "header_down -Pragma",
+                "header_down -Expires",
+            ],
+            upstream,
+        )
+        body += [
+            f"@{vpn_name}Static path /static/* *.js *.css *.png *.jpg *.svg *.ico *.woff *.woff2",
+            f"handle @{vpn_name}Static {{",
+            *(f"    {line}" for line in static_proxy),
+            "}",
+            "handle {",
+            *(f"    {line}" for line in ui_proxy),
+            "}",
+        ]
+    else:
+        body += ui_proxy
+
+    handle = "\n".join(f"        {line}" for line in body)
+    return f"""
+    @has{vpn_name}Cookie {{
+        header Cookie *use_vpn={vpn_name}*
+    }}
+    handle @has{vpn_name}Cookie {{
+{handle}
+    }}
+}}"""
+
+
+def _remove_caddy_block(caddy_content: str, vpn_name: str) -> str:
+    lines = caddy_content.split("\n")
+    new_lines = []
+    brace_count = 0
+    skip = False
+
+    for line in lines:
+        if f"@has{vpn_name}Cookie" in line:
+            skip = True
+            continue
+
+        if skip:
+            if "{" in line:
+                brace_count += 1
+            if "}" in line:
+                brace_count -= 1
+                if brace_count < 0:
+                    skip = False
+                    brace_count = 0
+            continue
+
+        new_lines.append(line)
+
+    caddy_content = "\n".join(new_lines).strip()
+    if not caddy_content.endswith("}"):
+        caddy_content += "\n}"
+    return caddy_content
+
+
+def _upgrade_caddyfile(caddy_content: str, caddy_config: dict) -> str:
+    # Caddyfiles created by older versions lack some routes of the template;
+    # each template section is copied in before the cookie rules when missing
+    template = load_template_with_update(
+        "templates/caddy/Caddyfile", get_caddyfile_directives(caddy_config)
+    )
+    positions = [(template.find(marker), marker) for marker in CADDYFILE_SECTIONS]
+    positions.append((template.find(CADDYFILE_ANCHOR), CADDYFILE_ANCHOR))
+    if any(position < 0 for position, _ in positions):
+        return caddy_content
+
+    for (start, marker), (end, _) in zip(positions, positions[1:]):
+        anchor = caddy_content.find(CADDYFILE_ANCHOR)
+        if marker.strip() in caddy_content or anchor < 0:
+            continue
+        caddy_content = caddy_content[:anchor] + template[start:end] + caddy_content[anchor:]
+    return caddy_content
 
 
 def _update_caddy_config(
@@ -277,177 +656,280 @@ def _update_caddy_config(
     vpn_name: str,
     hostname: str,
     remove: bool = False,
+    upstream: str = None,
 ) -> None:
     caddy_dir = get_caddy_path(caddy_name)
     vpn_select_path = os.path.join(caddy_dir, "static/vpn-select.html")
     caddyfile_path = os.path.join(caddy_dir, "Caddyfile")
+    caddy_config = read_settings("caddy_settings", dict(CADDY_DEFAULTS))
 
-    with open(vpn_select_path, "r") as f:
-        content = f.read()
+    with caddy_lock(caddy_name):
+        with open(vpn_select_path, "r") as f:
+            content = f.read()
 
-    start = content.find("const vpns = [")
-    end = content.find("];", start)
-    vpns_str = content[start:end].replace("const vpns = [", "").strip()
-    vpns = [v.strip(' "') for v in vpns_str.split(",") if v.strip()]
+        start = content.find("const vpns = [")
+        end = content.find("];", start)
+        vpns_str = content[start:end].replace("const vpns = [", "").strip()
+        vpns = [v.strip(' "') for v in vpns_str.split(",") if v.strip()]
 
-    if remove and vpn_name in vpns:
-        vpns.remove(vpn_name)
-    elif not remove and vpn_name not in vpns:
-        vpns.append(vpn_name)
+        # Pages created before the status document are upgraded in place
+        if "const statusUrl" not in content:
+            content = load_template_with_update("templates/caddy/vpn-select.html", {})
+            start = content.find("const vpns = [")
+            end = content.find("];", start)
 
-    if vpns:
-        new_vpns = f'const vpns = ["{"\", \"".join(vpns)}"];'
-    else:
-        new_vpns = "const vpns = [];"
-    content = content[:start] + new_vpns + content[end + 2 :]
+        if remove and vpn_name in vpns:
+            vpns.remove(vpn_name)
+        elif not remove and vpn_name not in vpns:
+            vpns.append(vpn_name)
 
-    with open(vpn_select_path, "w") as f:
-        f.write(content)
+        if vpns:
+            quoted = ", ".join(f'"{v}"' for v in vpns)
+            new_vpns = f"const vpns = [{quoted}];"
+        else:
+            new_vpns = "const vpns = [];"
+        content = content[:start] + new_vpns + content[end + 2 :]
+        precompress = get_precompress_formats(caddy_config)
 
-    with open(caddyfile_path, "r") as f:
-        caddy_content = f.read().strip()
+        with open(caddyfile_path, "r") as f:
+            caddy_content = f.read().strip()
 
-    if not remove:
-        if caddy_content.endswith("}"):
+        # Always drop the existing block first so re-running a step is idempotent
+        caddy_content = _remove_caddy_block(caddy_content, vpn_name)
+        caddy_content = _upgrade_caddyfile(caddy_content, caddy_config)
+        if not remove:
             caddy_content = caddy_content[:-1]
+            caddy_content += _render_vpn_proxy(vpn_name, hostname, caddy_config, upstream)
+
+        # Everything is rendered before the first write, so a bad setting
+        # never leaves the page listing a VPN that has no Caddy block
+        write_static_file(vpn_select_path, content, precompress)
+        unavailable_path = os.path.join(caddy_dir, "static/vpn-unavailable.html")
+        if not os.path.exists(unavailable_path):
+            write_static_file(
+                unavailable_path,
+                load_template_with_update("templates/caddy/vpn-unavailable.html", {}),
+                precompress,
+            )
+        atomic_write(caddyfile_path, caddy_content)
+
+
+def _clone_vpn_scaffold(docker: DockerManager, output_dir: str) -> None:
+    if os.path.exists(output_dir):
+        os.system(f"sudo rm -rf {output_dir}")
+    if os.system(
+        f"git clone https://github.com/d3vilh/openvpn-server.git {output_dir}"
+    ) != 0:
+        raise Exception("Failed to clone openvpn-server repository")
+    git_dir = os.path.join(output_dir, ".git")
+    github_dir = os.path.join(output_dir, ".github")
+
+    if os.path.exists(git_dir):
+        shutil.rmtree(git_dir)
+
+    if os.path.exists(github_dir):
+        shutil.rmtree(github_dir)
+    _create_vpn_directories(output_dir)
+    if docker:
+        with open(os.path.join(output_dir, HOST_FILE), "w") as f:
+            f.write(docker.host_name)
+
+
+def create_template(name: str, config: dict) -> str:
+    template_dir = get_template_path(name)
+    if os.path.exists(template_dir):
+        raise Exception(f"Template directory {template_dir} already exists")
+
+    key_size = config.get("easyrsa_key_size") or "4096"
+    tmp_dir = get_template_path(f".tmp-{name}")
+    try:
+        _clone_vpn_scaffold(None, tmp_dir)
+        # DH parameters are public and may be shared; keys and certificates are
+        # generated per VPN when forking
+        while not take_dh_params(key_size, os.path.join(tmp_dir, "dhparams", "dh.pem")):
+            if not fill_pool(key_size, 1):
+                # Another process is filling the pool, wait for its next set
+                time.sleep(5)
+        with open(os.path.join(tmp_dir, TEMPLATE_FILE), "w") as f:
+            f.write(key_size)
+        os.rename(tmp_dir, template_dir)
+    finally:
+        if os.path.exists(tmp_dir):
+            os.system(f"sudo rm -rf {tmp_dir}")
+    return template_dir
+
+
+def _fork_template(docker: DockerManager, template: str, output_dir: str, config: dict) -> None:
+    template_dir = get_template_path(template)
+    if not os.path.exists(os.path.join(template_dir, TEMPLATE_FILE)):
+        raise Exception(f"Template {template} not found. Create it with 'peony-vpn template {template}'")
+    if os.path.exists(output_dir):
+        os.system(f"sudo rm -rf {output_dir}")
+
+    start = time.monotonic()
+    # A VPN lives long and its containers write to the whole directory, so it
+    # must never share inodes with the template or other forks
+    method = clone_tree(template_dir, output_dir, hardlinks=False)
+    os.remove(os.path.join(output_dir, TEMPLATE_FILE))
+    with open(os.path.join(template_dir, TEMPLATE_FILE)) as f:
+        if f.read().strip() != (config.get("easyrsa_key_size") or "4096"):
+            shutil.rmtree(os.path.join(output_dir, "dhparams"), ignore_errors=True)
+    _create_vpn_directories(output_dir)
+    with open(os.path.join(output_dir, HOST_FILE), "w") as f:
+        f.write(docker.host_name)
+    print(f"Forked template {template} in {time.monotonic() - start:.2f}s ({method})")
+
+
+def _create_vpn_networks(docker: DockerManager, name: str, context: dict) -> None:
+    docker.remove_network(f"{name}-net")
+    docker.create_network(name=f"{name}-net", subnet=context["docker_subnet"])
+
+    if docker.is_remote:
+        caddy_config = read_settings("caddy_settings")
+        docker.ensure_network(
+            "vpn-proxy", caddy_config.get("vpn_docker_subnet", "172.28.0.0/24")
+        )
+    elif not docker.network_exists("vpn-proxy"):
+        raise Exception("vpn-proxy network not found. Create Caddy first.")
 
-        vpn_config = f"""
-    @has{vpn_name}Cookie {{
-        header Cookie *use_vpn={vpn_name}*
-    }}
-    handle @has{vpn_name}Cookie {{
-        reverse_proxy {vpn_name}-ui:8080 {{
-            header_up X-Forwarded-Host "{hostname}"
-            header_up X-Forwarded-Proto "https"
-            header_down Cache-Control "no-store, no-cache, must-revalidate, proxy-revalidate, max-age=0"
-            header_down Pragma "no-cache"
-            header_down Expires "0"
-            header_down X-Backend-Server "{vpn_name}-backend"
-        }}
-    }}
-}}"""
-        caddy_content += vpn_config
-    else:
-        lines = caddy_content.split("\n")
-        new_lines = []
-        brace_count = 0
-        skip = False
 
-        for line in lines:
-            if f"@has{vpn_name}Cookie" in line:
-                skip = True
-                continue
+def _prepare_pki(docker: DockerManager, output_dir: str, context: dict) -> None:
+    if _bootstrap_pki(docker, output_dir, context):
+        print("Using pre-generated DH parameters")
+    spawn_background_fill(context["EASYRSA_KEY_SIZE"])
 
-            if skip:
-                if "{" in line:
-                    brace_count += 1
-                if "}" in line:
-                    brace_count -= 1
-                    if brace_count < 0:
-                        skip = False
-                        brace_count = 0
-                continue
 
-            new_lines.append(line)
+def _restart_caddy(caddy_docker: DockerManager, caddy_name: str) -> None:
+    container = caddy_docker.get_container(caddy_name)
+    if container:
+        container.restart()
 
-        caddy_content = "\n".join(new_lines).strip()
-        if not caddy_content.endswith("}"):
-            caddy_content += "\n}"
 
-    with open(caddyfile_path, "w") as f:
-        f.write(caddy_content)
+def _wait_for_vpn(docker: DockerManager, name: str) -> None:
+    print("\nInitializing VPN server (this might take few minutes)...")
+    print("============================")
 
+    env = docker.cli_env()
+    log_cmd = f"{env}docker logs -f {name} & while ! {env}docker logs {name} 2>&1 | grep -q 'Start openvpn process'; do sleep 1; done && kill $!"
+    os.system(log_cmd)
 
-def create_vpn(docker: DockerManager, name: str, caddy_name: str, config: dict) -> str:
+    print("\n✓ VPN server initialized successfully!")
+
+
+def create_vpn(
+    docker: DockerManager,
+    name: str,
+    caddy_name: str,
+    config: dict,
+    caddy_docker: DockerManager = None,
+    template: str = None,
+) -> str:
+    caddy_docker = caddy_docker or docker
     caddy_dir = get_caddy_path(caddy_name)
     if not os.path.exists(caddy_dir):
         raise Exception(f"Caddy server {caddy_name} not found")
 
     output_dir = get_config_path(name)
-    if os.path.exists(output_dir):
+    if not read_journal(name) and os.path.exists(output_dir):
         raise Exception(f"VPN directory {output_dir} already exists")
 
-    try:
-        os.system(
-            f"git clone https://github.com/d3vilh/openvpn-server.git {output_dir}"
-        )
-        git_dir = os.path.join(output_dir, ".git")
-        github_dir = os.path.join(output_dir, ".github")
-
-        if os.path.exists(git_dir):
-            shutil.rmtree(git_dir)
+    with Journal("create", name) as journal:
+        # A resumed create keeps the template it was started with
+        template = journal.data.setdefault("template", template)
+        if template:
+            journal.run("clone", _fork_template, docker, template, output_dir, config)
+        else:
+            journal.run("clone", _clone_vpn_scaffold, docker, output_dir)
 
-        if os.path.exists(github_dir):
-            shutil.rmtree(github_dir)
-        _create_vpn_directories(output_dir)
+        def generate_context():
+            journal.data["context"] = _generate_vpn_context(
+                docker, name, config, output_dir, _generate_password()
+            )
 
-        admin_password = _generate_password()
-        context = _generate_vpn_context(
-            docker, name, config, output_dir, admin_password
+        journal.run("context", generate_context)
+        context = journal.data["context"]
+
+        journal.run("network", _create_vpn_networks, docker, name, context)
+        journal.run("configs", _update_vpn_configs, output_dir, context)
+        journal.run("pki", _prepare_pki, docker, output_dir, context)
+        journal.run(
+            "caddy",
+            _update_caddy_config,
+            docker,
+            caddy_name,
+            name,
+            context["hostname"],
+            upstream=_get_upstream(docker, name, context),
         )
+        journal.run("caddy_restart", _restart_caddy, caddy_docker, caddy_name)
+        journal.run(
+            "compose",
+            start_project,
+            docker,
+            output_dir,
+            "docker-compose.yml",
+        )
+        journal.run("ready", _wait_for_vpn, docker, name)
 
-        os.system(f"docker network rm {name}-net 2>/dev/null")
-        docker.create_network(name=f"{name}-net", subnet=context["docker_subnet"])
-
-        if os.system("docker network inspect vpn-proxy >/dev/null 2>&1") != 0:
-            raise Exception("vpn-proxy network not found. Create Caddy first.")
-
-        _update_vpn_configs(output_dir, context)
-        _update_caddy_config(docker, caddy_name, name, context["hostname"])
-
-        container = docker.get_container(caddy_name)
-        if container:
-            container.restart()
-
-        docker.start_compose(os.path.join(output_dir, "docker-compose.yml"))
-        print("\nInitializing VPN server (this might take few minutes)...")
-        print("============================")
-
-        log_cmd = f"docker logs -f {name} & while ! docker logs {name} 2>&1 | grep -q 'Start openvpn process'; do sleep 1; done && kill $!"
-        os.system(log_cmd)
-
-        print("\n✓ VPN server initialized successfully!")
-
-        return admin_password
-
-    except Exception as e:
-        if os.path.exists(output_dir):
-            os.system(f"sudo rm -rf {output_dir}")
-        try:
-            os.system(f"docker network rm {name}-net")
-        except:
-            pass
-        raise e
+        return context["admin_password"]
 
 
-def update_vpn(docker: DockerManager, name: str, caddy_name: str, config: dict) -> None:
+def update_vpn(
+    docker: DockerManager,
+    name: str,
+    caddy_name: str,
+    config: dict,
+    caddy_docker: DockerManager = None,
+) -> None:
+    caddy_docker = caddy_docker or docker
     output_dir = get_config_path(name)
     if not os.path.exists(output_dir):
         raise Exception(f"VPN {name} not found")
 
     try:
-        backup_vpn(docker, caddy_name, name)
-        docker_compose_path = os.path.join(output_dir, "docker-compose.yml")
-        with open(docker_compose_path) as f:
-            for line in f:
-                if "OPENVPN_ADMIN_PASSWORD=" in line:
-                    admin_password = line.split("=")[1].strip()
-                    break
-        context = _generate_vpn_context(
-            docker, name, config, output_dir, admin_password
-        )
-        _update_vpn_configs(output_dir, context)
-
-        docker.stop_container(name)
-        docker.stop_container(f"{name}-ui")
-
-        _update_caddy_config(docker, caddy_name, name, "", remove=True)
-        _update_caddy_config(docker, caddy_name, name, context["hostname"])
+        with Journal("update", name) as journal:
+            journal.run("backup", backup_vpn, docker, caddy_name, name)
+
+            def generate_context():
+                definition = read_services(output_dir)
+                if definition:
+                    environment = definition["services"]["openvpn-ui"]["environment"]
+                    admin_password = environment["OPENVPN_ADMIN_PASSWORD"]
+                else:
+                    # Directories created before .peony-services.json
+                    docker_compose_path = os.path.join(output_dir, "docker-compose.yml")
+                    with open(docker_compose_path) as f:
+                        for line in f:
+                            if "OPENVPN_ADMIN_PASSWORD=" in line:
+                                admin_password = line.split("=")[1].strip()
+                                break
+                journal.data["context"] = _generate_vpn_context(
+                    docker, name, config, output_dir, admin_password
+                )
 
-        docker.start_compose(os.path.join(output_dir, "docker-compose.yml"))
-        caddy = docker.get_container(caddy_name)
-        if caddy:
-            caddy.restart()
+            journal.run("context", generate_context)
+            context = journal.data["context"]
+
+            journal.run("configs", _update_vpn_configs, output_dir, context)
+            journal.run("stop_vpn", docker.stop_container, name)
+            journal.run("stop_ui", docker.stop_container, f"{name}-ui")
+            journal.run(
+                "caddy",
+                _update_caddy_config,
+                docker,
+                caddy_name,
+                name,
+                context["hostname"],
+                upstream=_get_upstream(docker, name, context),
+            )
+            journal.run(
+                "compose",
+                start_project,
+                docker,
+                output_dir,
+                "docker-compose.yml",
+            )
+            journal.run("caddy_restart", _restart_caddy, caddy_docker, caddy_name)
 
         print(f"Successfully updated VPN {name}")
 
@@ -456,50 +938,144 @@ def update_vpn(docker: DockerManager, name: str, caddy_name: str, config: dict)
         raise e
 
 
-def remove_vpn(docker: DockerManager, name: str, caddy_name: str) -> None:
+def _remove_vpn_files(vpn_path: str) -> None:
+    if os.path.exists(vpn_path):
+        os.system(f"sudo rm -rf {vpn_path}")
+
+
+def _remove_vpn_network(docker: DockerManager, name: str) -> None:
+    if not docker.remove_network(f"{name}-net"):
+        print(f"Network {name}-net already removed")
+
+
+def _remove_vpn_containers(docker: DockerManager, name: str) -> None:
+    for container_name in [name, f"{name}-ui"]:
+        docker.remove_container(container_name)
+
+
+def remove_vpn(
+    docker: DockerManager,
+    name: str,
+    caddy_name: str,
+    caddy_docker: DockerManager = None,
+) -> None:
+    caddy_docker = caddy_docker or docker
     vpn_path = get_config_path(name)
-    container = docker.get_container(name)
 
     print("\nRemoving VPN server (this might take few minutes)...")
 
-    if not os.path.exists(vpn_path) and not container:
-        print(f"No VPN configuration found in {vpn_path}")
-        raise Exception(f"VPN {name} does not exist. Nothing to remove.")
+    if not read_journal(name):
+        if not os.path.exists(vpn_path) and not docker.get_container(name):
+            print(f"No VPN configuration found in {vpn_path}")
+            raise Exception(f"VPN {name} does not exist. Nothing to remove.")
 
     try:
-        if os.path.exists(vpn_path):
-            backup_vpn(docker, caddy_name, name)
+        with Journal("remove", name) as journal:
+            if os.path.exists(vpn_path):
+                journal.run("backup", backup_vpn, docker, caddy_name, name)
+            journal.run("containers", _remove_vpn_containers, docker, name)
+            journal.run(
+                "caddy", _update_caddy_config, docker, caddy_name, name, "", remove=True
+            )
+            journal.run("caddy_restart", _restart_caddy, caddy_docker, caddy_name)
+            journal.run("network", _remove_vpn_network, docker, name)
+            journal.run("files", _remove_vpn_files, vpn_path)
 
-        for container_name in [name, f"{name}-ui"]:
-            docker.remove_container(container_name)
+    except Exception as e:
+        raise Exception(f"Failed to remove VPN {name}: {str(e)}")
 
-        _update_caddy_config(docker, caddy_name, name, "", remove=True)
-        caddy = docker.get_container(caddy_name)
-        if caddy:
-            caddy.restart()
 
-        try:
-            network = docker.client.networks.get(f"{name}-net")
-            network.remove()
-        except docker.errors.NotFound:
-            print(f"Network {name}-net already removed")
+def abort_vpn(
+    docker: DockerManager,
+    name: str,
+    caddy_name: str,
+    caddy_docker: DockerManager = None,
+) -> None:
+    caddy_docker = caddy_docker or docker
+    journal = read_journal(name)
+    if not journal:
+        raise Exception(f"No unfinished operation found for VPN {name}")
+
+    with Journal(journal["operation"], name, verbose=False) as pending:
+        if pending.operation != "create":
+            print(
+                f"Discarding unfinished {pending.operation} of {name} "
+                f"(completed steps: {', '.join(pending.steps) or 'none'})"
+            )
 
-        if os.path.exists(vpn_path):
-            os.system(f"sudo rm -rf {vpn_path}")
+        if pending.operation == "update":
+            # The update may have stopped the VPN; bring it back as it was,
+            # recreating it only if the compose step got as far as removing it
+            containers = [docker.get_container(n) for n in (f"{name}-ui", name)]
+            if all(containers):
+                for container in containers:
+                    if container.status != "running":
+                        container.start()
+            else:
+                start_project(docker, get_config_path(name), "docker-compose.yml")
+            print(f"VPN {name} restarted. Run 'peony-vpn update {name}' to apply the update")
+            return
 
-    except Exception as e:
-        raise Exception(f"Failed to remove VPN {name}: {str(e)}")
+        if pending.operation == "remove":
+            if pending.steps or not os.path.exists(get_config_path(name)):
+                print(
+                    f"⚠️  VPN {name} is left partially removed. Run 'peony-vpn remove {name}' "
+                    f"to finish, or restore its snapshot from {get_backup_path()}"
+                )
+            return
+
+        print(f"Rolling back unfinished creation of {name}...")
+        # A create interrupted inside the compose step may have left one
+        # container behind, and removing missing containers is a no-op
+        _remove_vpn_containers(docker, name)
+        if pending.done("caddy") or pending.done("configs"):
+            _update_caddy_config(docker, caddy_name, name, "", remove=True)
+            _restart_caddy(caddy_docker, caddy_name)
+        docker.remove_network(f"{name}-net")
+        _remove_vpn_files(get_config_path(name))
 
 
 def main():
     parser = argparse.ArgumentParser(description="Manage OpenVPN servers")
-    parser.add_argument("action", choices=["create", "update", "remove", "list"])
-    parser.add_argument("name", help="VPN name", nargs="?")
+    parser.add_argument(
+        "action",
+        choices=["create", "update", "remove", "list", "restart", "clients", "abort", "logs", "status", "template"],
+    )
+    parser.add_argument(
+        "name", help="VPN name (sub-action for clients and logs)", nargs="?"
+    )
+    parser.add_argument("vpn", help="VPN name for clients and logs actions", nargs="?")
     parser.add_argument("--caddy", help="Caddy container name")
+    parser.add_argument("--all", action="store_true", help="Apply to every VPN")
+    parser.add_argument(
+        "--concurrency",
+        type=positive_int,
+        default=8,
+        help="Maximum concurrent Docker API calls for fleet operations",
+    )
+    parser.add_argument(
+        "--from", dest="from_csv", help="CSV file with one client name per line"
+    )
+    parser.add_argument("--output", help="Client profiles archive (.zip, .tar, .tgz)")
+    parser.add_argument(
+        "--from-template", dest="template", help="Create the VPN from a prepared template"
+    )
+    parser.add_argument(
+        "--workers", type=positive_int, help="Parallel key generations for clients issue"
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="Rotate logs regardless of size and age"
+    )
+    parser.add_argument("--since", help="Show logs from a date or duration ago (e.g. 2h)")
+    parser.add_argument("--until", help="Show logs up to a date or duration ago")
+    parser.add_argument(
+        "--watch", action="store_true", help="Keep collecting VPN status every STATUS_INTERVAL"
+    )
     args = parser.parse_args()
 
     try:
-        docker = DockerManager()
+        fleet = DockerFleet.from_settings()
+        docker = fleet.local
         caddy_name = args.caddy or find_caddy_server()
 
         if not caddy_name:
@@ -508,7 +1084,49 @@ def main():
             )
 
         if args.action == "list":
-            list_vpns(docker, caddy_name)
+            list_vpns(fleet, caddy_name, args.concurrency)
+            return
+
+        if args.action == "status":
+            status_config = read_settings("caddy_settings", dict(STATUS_DEFAULTS))
+            if args.watch:
+                watch_status(fleet, caddy_name, status_config, args.concurrency)
+                return
+            status = update_status(fleet, caddy_name, status_config, args.concurrency)
+            print("\n======= VPN Status =======")
+            for vpn, vpn_status in status["vpns"].items():
+                health = "✓" if vpn_status["healthy"] else f"✗ {vpn_status['state']}"
+                clients = vpn_status["clients"] if vpn_status["clients"] is not None else "N/A"
+                recommended = " (recommended)" if vpn == status["recommended"] else ""
+                print(f"- {vpn}: {health}, clients: {clients}{recommended}")
+            return
+
+        if args.action == "restart":
+            if not args.all and not args.name:
+                raise ValueError("VPN name or --all is required for restart action")
+            vpns = read_vpn_list(caddy_name) if args.all else [args.name]
+            restart_vpns(fleet, vpns, args.concurrency)
+            return
+
+        if args.action == "clients":
+            if args.name != "issue" or not args.vpn:
+                raise ValueError("Usage: clients issue <vpn> --from users.csv")
+            if not args.from_csv:
+                raise ValueError("--from is required for clients issue")
+            issue_clients(
+                fleet.for_vpn(args.vpn), args.vpn, args.from_csv, args.output, args.workers
+            )
+            return
+
+        if args.action == "logs":
+            if args.name not in ("rotate", "status", "show"):
+                raise ValueError("Usage: logs rotate|status|show <vpn> (or --all)")
+            if args.name == "show" and not args.vpn:
+                raise ValueError("VPN name is required for logs show")
+            if not args.all and not args.vpn:
+                raise ValueError("VPN name or --all is required for logs action")
+            vpns = read_vpn_list(caddy_name) if args.all and args.name != "show" else [args.vpn]
+            manage_logs(args.name, vpns, read_settings("vpn_settings", dict(LOG_DEFAULTS)), args)
             return
 
         if not args.name:
@@ -521,12 +1139,29 @@ def main():
             {"openvpn_prot": "udp", "openvpn_gateway": "false", "openvpn_dns": "false"},
         )
 
-        _validate_vpn_settings(config)
+        _validate_vpn_settings(
+            config, args.name if args.action in ("create", "update") else None
+        )
+
+        if args.action == "template":
+            start = time.monotonic()
+            template_dir = create_template(args.name, config)
+            print(f"Created template {args.name} in {template_dir} ({time.monotonic() - start:.1f}s)")
+            return
+
+        if args.action == "abort":
+            abort_vpn(fleet.for_vpn(args.name), args.name, caddy_name, docker)
+            print(f"Aborted unfinished operation on VPN {args.name}")
+            return
 
         if args.action == "create":
-            admin_password = create_vpn(docker, args.name, caddy_name, config)
-            vpn_port = docker.get_container_port(args.name)
-            subnets = calculate_subnets(args.name)
+            resumed = os.path.exists(os.path.join(vpn_path, HOST_FILE))
+            vpn_docker = fleet.for_vpn(args.name) if resumed else fleet.place()
+            admin_password = create_vpn(
+                vpn_docker, args.name, caddy_name, config, docker, args.template
+            )
+            vpn_port = vpn_docker.get_container_port(args.name)
+            subnets = calculate_subnets(args.name, vpn_docker)
             caddy_config = read_settings("caddy_settings")
 
             print("\n======= VPN Summary =======")
@@ -541,13 +1176,15 @@ def main():
             print("\n=== Network Details ===")
             print(f"VPN IP Range: {subnets['trust_subnet']}/24")
             print(f"Docker UI Network: {subnets['docker_subnet']}")
-            print(f"Host: {caddy_config['hostname']} (Port: {vpn_port})")
+            print(
+                f"Host: {vpn_docker.host_address or caddy_config['hostname']} (Port: {vpn_port})"
+            )
             print("\n============================")
         elif args.action == "update":
-            update_vpn(docker, args.name, caddy_name, config)
+            update_vpn(fleet.for_vpn(args.name), args.name, caddy_name, config, docker)
             print(f"Updated VPN {args.name} in {vpn_path}")
         else:
-            remove_vpn(docker, args.name, caddy_name)
+            remove_vpn(fleet.for_vpn(args.name), args.name, caddy_name, docker)
             print(f"\n✓Removed VPN {args.name} from {vpn_path} !")
 
     except Exception as err: